@@ -0,0 +1,36 @@
+"""add todo list indexes
+
+Revision ID: 8d2f4b7c1e90
+Revises: 307cc00c3982
+Create Date: 2026-10-17 12:10:41.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f4b7c1e90'
+down_revision: Union[str, Sequence[str], None] = '307cc00c3982'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_todos_user_id_created_at_id', 'todos', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_todos_user_id_due_date_id', 'todos', ['user_id', 'due_date', 'id'], unique=False)
+    op.create_index('ix_todos_user_id_priority_id', 'todos', ['user_id', 'priority', 'id'], unique=False)
+    op.create_index('ix_todos_user_id_category_id', 'todos', ['user_id', 'category_id'], unique=False)
+    op.create_index('ix_todo_tags_tag_id', 'todo_tags', ['tag_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_tags_tag_id', table_name='todo_tags')
+    op.drop_index('ix_todos_user_id_category_id', table_name='todos')
+    op.drop_index('ix_todos_user_id_priority_id', table_name='todos')
+    op.drop_index('ix_todos_user_id_due_date_id', table_name='todos')
+    op.drop_index('ix_todos_user_id_created_at_id', table_name='todos')
@@ -0,0 +1,54 @@
+"""add sync feed
+
+Revision ID: a1c7e4d93f18
+Revises: f3a8d6b21c54
+Create Date: 2026-10-17 20:47:31.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c7e4d93f18'
+down_revision: Union[str, Sequence[str], None] = 'f3a8d6b21c54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sync_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('collection', sa.String(), nullable=False),
+    sa.Column('object_id', sa.Integer(), nullable=False),
+    sa.Column('sync_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sync_tombstones_deleted_at'), 'sync_tombstones', ['deleted_at'], unique=False)
+    op.create_index('ix_sync_tombstones_user_id_sync_seq', 'sync_tombstones', ['user_id', 'sync_seq'], unique=False)
+    # существующие строки получают 0 и попадают в первую полную синхронизацию
+    op.add_column('todos', sa.Column('sync_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('categories', sa.Column('sync_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('tags', sa.Column('sync_seq', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_todos_user_id_sync_seq', 'todos', ['user_id', 'sync_seq'], unique=False)
+    op.create_index('ix_categories_user_id_sync_seq', 'categories', ['user_id', 'sync_seq'], unique=False)
+    op.create_index('ix_tags_user_id_sync_seq', 'tags', ['user_id', 'sync_seq'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tags_user_id_sync_seq', table_name='tags')
+    op.drop_index('ix_categories_user_id_sync_seq', table_name='categories')
+    op.drop_index('ix_todos_user_id_sync_seq', table_name='todos')
+    op.drop_column('tags', 'sync_seq')
+    op.drop_column('categories', 'sync_seq')
+    op.drop_column('todos', 'sync_seq')
+    op.drop_index('ix_sync_tombstones_user_id_sync_seq', table_name='sync_tombstones')
+    op.drop_index(op.f('ix_sync_tombstones_deleted_at'), table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
@@ -0,0 +1,43 @@
+"""add unique tag name per user
+
+Revision ID: b41e6a9d3c27
+Revises: 8d2f4b7c1e90
+Create Date: 2026-10-17 13:02:17.540921
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e6a9d3c27'
+down_revision: Union[str, Sequence[str], None] = '8d2f4b7c1e90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # дубликаты тегов сливаются в тег с наименьшим id
+    op.execute("""
+        CREATE TEMPORARY TABLE tag_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY user_id, name) AS keep_id FROM tags
+        ) t
+        WHERE id <> keep_id
+    """)
+    op.execute("""
+        INSERT INTO todo_tags (todo_id, tag_id)
+        SELECT tt.todo_id, d.keep_id
+        FROM todo_tags tt JOIN tag_duplicates d ON d.id = tt.tag_id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("DELETE FROM tags WHERE id IN (SELECT id FROM tag_duplicates)")
+    op.create_unique_constraint('uq_tags_user_id_name', 'tags', ['user_id', 'name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_tags_user_id_name', 'tags', type_='unique')
@@ -0,0 +1,69 @@
+"""add todo stats
+
+Revision ID: b8e2f5a91c3d
+Revises: a1c7e4d93f18
+Create Date: 2026-10-17 22:05:12.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f5a91c3d'
+down_revision: Union[str, Sequence[str], None] = 'a1c7e4d93f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('todos', sa.Column('completed_on', sa.Date(), nullable=True))
+    op.create_table('todo_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('priority', postgresql.ENUM('P1', 'P2', 'P3', name='priority', create_type=False), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'priority')
+    )
+    op.create_table('todo_day_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('due_open', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    # день выполнения до этой миграции не хранился: берется время последнего изменения
+    op.execute(
+        "UPDATE todos SET completed_on = CAST(coalesce(updated_at, created_at) AS DATE) WHERE completed"
+    )
+    op.execute("""
+        INSERT INTO todo_stats (user_id, priority, total, completed)
+        SELECT user_id, priority, count(*), count(*) FILTER (WHERE completed)
+        FROM todos WHERE user_id IS NOT NULL
+        GROUP BY user_id, priority
+    """)
+    op.execute("""
+        INSERT INTO todo_day_stats (user_id, day, due_open, completed)
+        SELECT user_id, day, sum(due_open), sum(completed) FROM (
+            SELECT user_id, due_date AS day, 1 AS due_open, 0 AS completed
+            FROM todos WHERE completed IS NOT TRUE AND due_date IS NOT NULL
+            UNION ALL
+            SELECT user_id, completed_on, 0, 1
+            FROM todos WHERE completed AND completed_on IS NOT NULL
+        ) AS days
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id, day
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('todo_day_stats')
+    op.drop_table('todo_stats')
+    op.drop_column('todos', 'completed_on')
@@ -0,0 +1,35 @@
+"""add collection versions
+
+Revision ID: c5d9e2f17a40
+Revises: e7a3c5f08b12
+Create Date: 2026-10-17 19:41:08.215364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d9e2f17a40'
+down_revision: Union[str, Sequence[str], None] = 'e7a3c5f08b12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('collection_versions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('collection', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'collection')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('collection_versions')
@@ -0,0 +1,31 @@
+"""add tag prefix index
+
+Revision ID: d4f1a7c2e689
+Revises: b8e2f5a91c3d
+Create Date: 2026-10-17 23:41:08.517230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f1a7c2e689'
+down_revision: Union[str, Sequence[str], None] = 'b8e2f5a91c3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_tags_user_id_lower_name', 'tags',
+        ['user_id', sa.text('lower(name) text_pattern_ops')], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tags_user_id_lower_name', table_name='tags')
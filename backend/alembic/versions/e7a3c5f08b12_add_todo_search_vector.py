@@ -0,0 +1,33 @@
+"""add todo search vector
+
+Revision ID: e7a3c5f08b12
+Revises: b41e6a9d3c27
+Create Date: 2026-10-17 14:26:53.019334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c5f08b12'
+down_revision: Union[str, Sequence[str], None] = 'b41e6a9d3c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "ALTER TABLE todos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED"
+    )
+    op.create_index('ix_todos_search_vector', 'todos', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todos_search_vector', table_name='todos', postgresql_using='gin')
+    op.drop_column('todos', 'search_vector')
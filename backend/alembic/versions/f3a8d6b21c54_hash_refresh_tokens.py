@@ -0,0 +1,41 @@
+"""hash refresh tokens
+
+Revision ID: f3a8d6b21c54
+Revises: c5d9e2f17a40
+Create Date: 2026-10-17 20:12:44.903127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d6b21c54'
+down_revision: Union[str, Sequence[str], None] = 'c5d9e2f17a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("DELETE FROM refresh_tokens WHERE expires_at <= now()")
+    # действующие токены продолжают работать: хранится sha256 того же значения
+    op.execute("UPDATE refresh_tokens SET token = encode(sha256(convert_to(token, 'UTF8')), 'hex')")
+    op.drop_index(op.f('ix_refresh_tokens_token'), table_name='refresh_tokens')
+    op.alter_column('refresh_tokens', 'token', new_column_name='token_hash')
+    op.create_index(op.f('ix_refresh_tokens_token_hash'), 'refresh_tokens', ['token_hash'], unique=True)
+    op.create_index(op.f('ix_refresh_tokens_expires_at'), 'refresh_tokens', ['expires_at'], unique=False)
+    op.create_index('ix_refresh_tokens_user_id_created_at', 'refresh_tokens', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # исходные токены из хешей не восстановить - все сессии завершаются
+    op.drop_index('ix_refresh_tokens_user_id_created_at', table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_expires_at'), table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_token_hash'), table_name='refresh_tokens')
+    op.execute("DELETE FROM refresh_tokens")
+    op.alter_column('refresh_tokens', 'token_hash', new_column_name='token')
+    op.create_index(op.f('ix_refresh_tokens_token'), 'refresh_tokens', ['token'], unique=True)
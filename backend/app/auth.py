@@ -1,49 +1,240 @@
+import asyncio
+import hashlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
 from os import getenv
 import secrets
+import time
+from collections import OrderedDict
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from jose import jwt, JWTError
 
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import schemas, models
+from . import events, metrics, schemas, models
 from .database import get_db
 
 SECRET_KEY = getenv('AUTH_SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_DAYS = 180
+# сколько сессий (refresh-токенов) может быть у пользователя; самые старые вытесняются
+REFRESH_TOKEN_MAX_SESSIONS = int(getenv("REFRESH_TOKEN_MAX_SESSIONS", "10"))
+# фоновая очистка просроченных токенов (см. main.lifespan); 0 - выключена
+REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS = float(getenv("REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS", "3600"))
+REFRESH_TOKEN_SWEEP_BATCH_SIZE = int(getenv("REFRESH_TOKEN_SWEEP_BATCH_SIZE", "1000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt блокирует поток на ~200 мс, поэтому хеширование идет в отдельном пуле
+BCRYPT_ROUNDS = int(getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_EXECUTOR = getenv("PASSWORD_HASH_EXECUTOR", "thread")  # thread | process
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(getenv("PASSWORD_HASH_MAX_QUEUE", "100"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+USER_CACHE_TTL_SECONDS = float(getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+_hash_executor: Optional[Executor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+# ожидающие слота; счетчик воркера, метрика суммируется по всем воркерам
+_hash_queued = 0
 
-def get_password_hash(password):
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def create_refresh_token(db: Session, user_id: int) -> str:
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def _run_hasher(func, *args):
+    """Выполняет func в пуле хеширования, не больше PASSWORD_HASH_WORKERS одновременно"""
+    global _hash_executor, _hash_slots, _hash_queued
+    if _hash_executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+    if _hash_queued >= PASSWORD_HASH_MAX_QUEUE:
+        metrics.PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, попробуйте позже",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_queued += 1
+    metrics.PASSWORD_HASH_QUEUE_DEPTH.inc()
+    try:
+        await _hash_slots.acquire()
+    finally:
+        _hash_queued -= 1
+        metrics.PASSWORD_HASH_QUEUE_DEPTH.dec()
+
+    metrics.PASSWORD_HASH_IN_FLIGHT.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        metrics.PASSWORD_HASH_IN_FLIGHT.dec()
+        metrics.PASSWORD_HASH_COMPLETED.inc()
+        _hash_slots.release()
+
+def shutdown_password_hasher():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+async def verify_password(plain_password, hashed_password):
+    valid, _ = await verify_and_update_password(plain_password, hashed_password)
+    return valid
+
+async def verify_and_update_password(plain_password, hashed_password) -> tuple[bool, Optional[str]]:
+    """Проверяет пароль; второй элемент - новый хеш, если сменились настройки bcrypt"""
+    return await _run_hasher(_verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await _run_hasher(_hash, password)
+
+class UserCache:
+    """LRU-кеш пользователей по id с ограничением времени жизни записи"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[float, schemas.CurrentUser]] = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[schemas.CurrentUser]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            metrics.USER_CACHE_MISSES.inc()
+            return None
+        self._entries.move_to_end(user_id)
+        metrics.USER_CACHE_HITS.inc()
+        return entry[1]
+
+    def set(self, user: schemas.CurrentUser):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE)
+
+def invalidate_user(user_id: int):
+    """Вызывать после коммита изменения пользователя: деактивация, смена пароля, email.
+
+    Сбрасывает только кеш этого воркера; остальные узнают об изменении из events.user_changed,
+    вызванного в той же транзакции. Без него (или с EVENTS_BACKEND=memory при нескольких
+    воркерах) другие воркеры пускают деактивированного пользователя до USER_CACHE_TTL_SECONDS.
+    """
+    user_cache.invalidate(user_id)
+
+def _on_user_changed(user_id: Optional[int]):
+    if user_id is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate(user_id)
+
+events.on_user_changed(_on_user_changed)
+
+def _hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def create_refresh_token(db: AsyncSession, user_id: int) -> str:
+    """Выдает новый токен и вытесняет сессии сверх REFRESH_TOKEN_MAX_SESSIONS"""
     token = secrets.token_urlsafe(32)
-    expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    db_token = models.RefreshToken(token=token, user_id=user_id, expires_at=expires_at)
-    db.add(db_token)
-    db.commit()
+    now = datetime.now(timezone.utc)
+    db.add(models.RefreshToken(
+        token_hash=_hash_refresh_token(token),
+        user_id=user_id,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    await db.flush()
+
+    newest = (
+        select(models.RefreshToken.id)
+        .filter(models.RefreshToken.user_id == user_id)
+        .order_by(models.RefreshToken.created_at.desc(), models.RefreshToken.id.desc())
+        .limit(REFRESH_TOKEN_MAX_SESSIONS)
+    )
+    await db.execute(
+        delete(models.RefreshToken)
+        .filter(
+            models.RefreshToken.user_id == user_id,
+            (models.RefreshToken.id.not_in(newest)) | (models.RefreshToken.expires_at <= now),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
     return token
 
-def replace_refresh_token(db: Session, old_token: models.RefreshToken) -> str:
-    db.delete(old_token)
-    db.commit()
-    return create_refresh_token(db, old_token.user_id)
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Optional[tuple[str, schemas.CurrentUser]]:
+    """Меняет действующий токен на новый одним UPDATE ... RETURNING.
+
+    Из параллельных запросов с одним токеном успешен только первый.
+    """
+    new_token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    active_users = select(models.User.id).filter(models.User.is_active.is_(True))
+    result = await db.execute(
+        update(models.RefreshToken)
+        .filter(
+            models.RefreshToken.token_hash == _hash_refresh_token(token),
+            models.RefreshToken.expires_at > now,
+            models.RefreshToken.user_id.in_(active_users),
+        )
+        .values(
+            token_hash=_hash_refresh_token(new_token),
+            expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            created_at=func.now(),
+        )
+        .returning(models.RefreshToken.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    user_id = result.scalar()
+    if user_id is None:
+        await db.rollback()
+        return None
 
-def verify_refresh_token(db: Session, token: str) -> Optional[models.RefreshToken]:
-    db_token = db.query(models.RefreshToken).filter(models.RefreshToken.token == token).first()
-    if db_token and db_token.expires_at > datetime.now(timezone.utc):
-        return db_token
-    return None
+    user = await _load_current_user(db, user_id)
+    await db.commit()
+    return new_token, user
+
+async def purge_expired_refresh_tokens(db: AsyncSession, batch_size: int = REFRESH_TOKEN_SWEEP_BATCH_SIZE) -> int:
+    """Удаляет просроченные токены пачками по batch_size, коммитя каждую пачку"""
+    deleted = 0
+    while True:
+        expired = (
+            select(models.RefreshToken.id)
+            .filter(models.RefreshToken.expires_at <= datetime.now(timezone.utc))
+            .limit(batch_size)
+        )
+        result = await db.execute(
+            delete(models.RefreshToken)
+            .filter(models.RefreshToken.id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Создает JWT-токен с данными пользователя"""
@@ -57,7 +248,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def _load_current_user(db: AsyncSession, user_id: int) -> Optional[schemas.CurrentUser]:
+    user = user_cache.get(user_id)
+    if user is None:
+        db_user = await db.get(models.User, user_id)
+        if db_user is not None:
+            user = schemas.CurrentUser.model_validate(db_user)
+            user_cache.set(user)
+    return user
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> schemas.CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -69,11 +271,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+        token_data = schemas.TokenData(email=email, user_id=payload.get("uid"))
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    if user is None:
+    user = None
+    if token_data.user_id is not None:
+        user = await _load_current_user(db, token_data.user_id)
+    else:
+        # токены, выданные до появления uid
+        result = await db.execute(select(models.User).filter(models.User.email == token_data.email))
+        db_user = result.scalars().first()
+        if db_user is not None:
+            user = schemas.CurrentUser.model_validate(db_user)
+
+    if user is None or user.email != token_data.email or not user.is_active:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,165 @@
+"""Кэш готовых JSON-ответов GET /todos, /categories и /tags.
+
+Ключ - пользователь, список и строка запроса; вместе с телом и заголовками
+хранится версия списка (collection_versions), при которой ответ собран. crud
+увеличивает версии затронутых списков при каждой записи, поэтому запись
+инвалидирует ровно их, а устаревший ответ перезаписывается при следующем промахе.
+Версию читает зависимость etag.collection_etag, она же кладет ключ в request.state.
+"""
+import logging
+import time
+from collections import OrderedDict
+from os import getenv
+
+import orjson
+from fastapi import Request, Response
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# off, memory - LRU в каждом воркере, redis - общий для всех воркеров
+RESPONSE_CACHE = getenv("RESPONSE_CACHE", "memory")
+RESPONSE_CACHE_MAX_BYTES = int(getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 2**20)))
+# большие страницы (limit=10000) не кэшируются
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(2**20)))
+RESPONSE_CACHE_TTL_SECONDS = int(getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+REDIS_URL = getenv("REDIS_URL", "redis://localhost:6379/0")
+# кэш не должен замедлять запросы: при медленном Redis ответ собирается из базы
+REDIS_TIMEOUT_SECONDS = float(getenv("REDIS_TIMEOUT_SECONDS", "0.05"))
+
+
+class LRUCache:
+    """Кэш в памяти процесса, ограниченный суммарным размером значений"""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes and self._data:
+            self._remove(next(iter(self._data)))
+        self._report()
+
+    def _remove(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.size -= len(value)
+        self._report()
+
+    def _report(self) -> None:
+        metrics.RESPONSE_CACHE_ENTRIES.set(len(self._data))
+        metrics.RESPONSE_CACHE_BYTES.set(self.size)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisCache:
+    """Общий кэш для всех воркеров; ошибки Redis считаются промахом"""
+
+    def __init__(self, client=None):
+        # redis импортируется только с этим бэкендом: ~80 мс к запуску воркера
+        import redis.asyncio as redis
+
+        self.client = client or redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_TIMEOUT_SECONDS, socket_connect_timeout=REDIS_TIMEOUT_SECONDS
+        )
+        self.errors = (redis.RedisError, OSError)
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            return await self.client.get(key)
+        except self.errors as e:
+            metrics.RESPONSE_CACHE_ERRORS.inc()
+            logger.debug("response cache get failed: %s", e)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            await self.client.set(key, value, ex=ttl)
+        except self.errors as e:
+            metrics.RESPONSE_CACHE_ERRORS.inc()
+            logger.debug("response cache set failed: %s", e)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class FakeRedis:
+    """Замена redis.asyncio.Redis для тестов: GET и SET с EX в словаре"""
+
+    def __init__(self):
+        self.data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        expires_at, value = self.data.get(key, (0, None))
+        return value if expires_at > time.monotonic() else None
+
+    async def set(self, key: str, value: bytes, ex: int) -> None:
+        self.data[key] = (time.monotonic() + ex, value)
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _create_backend():
+    if RESPONSE_CACHE == "off":
+        return None
+    if RESPONSE_CACHE == "memory":
+        return LRUCache()
+    if RESPONSE_CACHE == "redis":
+        return RedisCache()
+    raise ValueError(f"Unknown RESPONSE_CACHE: {RESPONSE_CACHE}")
+
+
+backend = _create_backend()
+
+
+async def cached_response(request: Request, headers) -> Response | None:
+    """Ответ из кэша, если он собран при текущей версии списка; headers - заголовки ETag"""
+    entry = getattr(request.state, "response_cache", None)
+    if backend is None or entry is None:
+        return None
+    key, collection, version = entry
+    value = await backend.get(key)
+    if value is not None:
+        cached_version, cached_headers, body = value.split(b"\n", 2)
+        if int(cached_version) == version:
+            metrics.RESPONSE_CACHE_REQUESTS.labels(collection, "hit").inc()
+            return Response(body, media_type="application/json", headers={**orjson.loads(cached_headers), **headers})
+    metrics.RESPONSE_CACHE_REQUESTS.labels(collection, "miss").inc()
+    return None
+
+
+async def cache_response(request: Request, response: Response) -> Response:
+    """Сохраняет тело и заголовки готового ответа и возвращает его"""
+    entry = getattr(request.state, "response_cache", None)
+    if backend is None or entry is None or len(response.body) > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+        return response
+    key, _, version = entry
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    value = b"%d\n%s\n%s" % (version, orjson.dumps(headers), response.body)
+    await backend.set(key, value, RESPONSE_CACHE_TTL_SECONDS)
+    metrics.RESPONSE_CACHE_ENTRY_SIZE.observe(len(value))
+    return response
+
+
+async def close() -> None:
+    if backend is not None:
+        await backend.close()
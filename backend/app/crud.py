@@ -1,215 +1,1215 @@
-from sqlalchemy.orm import Session, joinedload
-from . import models, schemas, auth
+import base64
+import json
+from datetime import date, datetime, timedelta, timezone
+from os import getenv
 
+from sqlalchemy import and_, case, delete, false, func, insert, literal, literal_column, or_, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from . import models, schemas, auth, events
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+# удаления в ленте /sync хранятся столько дней; клиенты с более старым курсором получают reset
+SYNC_TOMBSTONE_RETENTION_DAYS = int(getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "90"))
+# POST /import: строк на один INSERT
+IMPORT_BATCH_SIZE = int(getenv("IMPORT_BATCH_SIZE", "1000"))
+# при большем числе созданных задач событие уходит без списка id, клиенту нужен /sync
+IMPORT_EVENT_MAX_IDS = 1000
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+async def get_user(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.User).filter(models.User.id == user_id))
+    return result.scalars().first()
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).filter(models.User.email == email))
+    return result.scalars().first()
+
+async def get_user_stats(db: AsyncSession, user_id: int):
+    """Сводка по задачам, категориям и тегам пользователя одним запросом по счетчикам /stats"""
+    today = date.today()
+
+    def total(column, *criteria):
+        table = column.class_
+        return (
+            select(func.coalesce(func.sum(column), 0))
+            .filter(table.user_id == user_id, *criteria)
+            .scalar_subquery()
+        )
+
+    category_count = (
+        select(func.count()).select_from(models.Category)
+        .filter(models.Category.user_id == user_id).scalar_subquery()
+    )
+    tag_count = (
+        select(func.count()).select_from(models.Tag)
+        .filter(models.Tag.user_id == user_id).scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            total(models.TodoStat.total),
+            total(models.TodoStat.completed),
+            total(models.TodoDayStat.due_open, models.TodoDayStat.day < today),
+            total(models.TodoDayStat.due_open, models.TodoDayStat.day == today),
+            category_count,
+            tag_count,
+        )
+    )
+    todo_count, completed_count, overdue_count, due_today_count, categories, tags = result.one()
+    return schemas.UserStats(
+        todo_count=todo_count,
+        completed_count=completed_count,
+        open_count=todo_count - completed_count,
+        overdue_count=overdue_count,
+        due_today_count=due_today_count,
+        category_count=categories,
+        tag_count=tags,
+    )
+
+async def get_stats(db: AsyncSession, user_id: int, days: int = 30):
+    """Статистика для дашборда из счетчиков todo_stats и todo_day_stats.
+
+    Два запроса по первичным ключам; время зависит от числа дней со сроками
+    и выполнениями, а не от числа задач.
+    """
+    today = date.today()
+    since = today - timedelta(days=days - 1)
+
+    by_priority = {priority: schemas.PriorityStats(total=0, completed=0, open=0) for priority in models.Priority}
+    result = await db.execute(
+        select(models.TodoStat.priority, models.TodoStat.total, models.TodoStat.completed)
+        .filter(models.TodoStat.user_id == user_id)
+    )
+    for priority, total, completed in result.all():
+        by_priority[priority] = schemas.PriorityStats(total=total, completed=completed, open=total - completed)
+
+    day = models.TodoDayStat.day
+    result = await db.execute(
+        select(day, models.TodoDayStat.due_open, models.TodoDayStat.completed).filter(
+            models.TodoDayStat.user_id == user_id,
+            or_(day.between(since, today), and_(day < since, models.TodoDayStat.due_open != 0)),
+        )
+    )
+    overdue = due_today = 0
+    completed_by_day = {}
+    for stat_day, due_open, completed in result.all():
+        if stat_day < today:
+            overdue += due_open
+        elif stat_day == today:
+            due_today += due_open
+        if stat_day >= since:
+            completed_by_day[stat_day] = completed
+
+    total = sum(stats.total for stats in by_priority.values())
+    completed = sum(stats.completed for stats in by_priority.values())
+    return schemas.TodoStats(
+        total=total,
+        completed=completed,
+        open=total - completed,
+        overdue=overdue,
+        due_today=due_today,
+        by_priority=by_priority,
+        completed_per_day=[
+            schemas.DayCompletions(day=day, completed=completed_by_day.get(day, 0))
+            for day in (since + timedelta(days=i) for i in range(days))
+        ],
+    )
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await auth.get_password_hash(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email=email)
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email=email)
 
-    if not user or not auth.verify_password(password, user.hashed_password):
+    if not user:
         return False
 
+    valid, new_hash = await auth.verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        return False
+
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     return user
 
+async def change_password(db: AsyncSession, user_id: int, new_password: str):
+    """Новый пароль отзывает все сессии; кеш пользователя сбрасывается во всех воркерах"""
+    hashed_password = await auth.get_password_hash(new_password)
+    await db.execute(
+        update(models.User).filter(models.User.id == user_id).values(hashed_password=hashed_password)
+    )
+    await db.execute(delete(models.RefreshToken).filter(models.RefreshToken.user_id == user_id))
+    await events.user_changed(db, user_id)
+    await db.commit()
+    auth.invalidate_user(user_id)
+
+async def set_user_active(db: AsyncSession, user_id: int, is_active: bool):
+    """Блокировка и разблокировка пользователя (для админских скриптов); работает и вне воркера"""
+    await db.execute(update(models.User).filter(models.User.id == user_id).values(is_active=is_active))
+    if not is_active:
+        await db.execute(delete(models.RefreshToken).filter(models.RefreshToken.user_id == user_id))
+    await events.user_changed(db, user_id)
+    await db.commit()
+    auth.invalidate_user(user_id)
+
 # CRUD для задачника
-def get_todos(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+def _todo_query(user_id: int):
     return (
-        db.query(models.Todo)
-        .options(joinedload(models.Todo.category), joinedload(models.Todo.tags))
+        select(models.Todo)
+        .options(selectinload(models.Todo.category), selectinload(models.Todo.tags))
         .filter(models.Todo.user_id == user_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
     )
 
-def create_todo(db: Session, todo: schemas.TodoCreate, user_id: int):
-    data = todo.model_dump(exclude={"tags"})
-    db_todo = models.Todo(**data, user_id=user_id)
+async def get_todo(db: AsyncSession, todo_id: int, user_id: int):
+    result = await db.execute(
+        _todo_query(user_id)
+        .filter(models.Todo.id == todo_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+TODO_SORT_COLUMNS = {
+    "created_at": models.Todo.created_at,
+    "due_date": models.Todo.due_date,
+    "priority": models.Todo.priority,
+}
+
+def _apply_todo_filters(query, filters: schemas.TodoFilters | None):
+    if filters is None:
+        return query
+    if filters.completed is not None:
+        query = query.filter(models.Todo.completed == filters.completed)
+    if filters.priority is not None:
+        query = query.filter(models.Todo.priority == filters.priority)
+    if filters.category_id is not None:
+        query = query.filter(models.Todo.category_id == filters.category_id)
+    if filters.tag is not None:
+        query = query.filter(models.Todo.tags.any(models.Tag.name == filters.tag))
+    if filters.due_from is not None:
+        query = query.filter(models.Todo.due_date >= filters.due_from)
+    if filters.due_to is not None:
+        query = query.filter(models.Todo.due_date <= filters.due_to)
+    return query
+
+def encode_todo_cursor(todo: dict, sort: str, order: str) -> str:
+    """Непрозрачный курсор: значение ключа сортировки и id последней задачи страницы"""
+    value = todo[sort]
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    elif isinstance(value, models.Priority):
+        value = value.value
+    raw = json.dumps({"s": sort, "o": order, "k": value, "id": todo["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_todo_cursor(cursor: str, sort: str, order: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] != sort or data["o"] != order:
+            raise ValueError("cursor was issued for a different sort order")
+        value = data["k"]
+        if value is not None:
+            if sort == "created_at":
+                value = datetime.fromisoformat(value)
+            elif sort == "due_date":
+                value = date.fromisoformat(value)
+            else:
+                value = models.Priority(value)
+        return value, int(data["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _apply_todo_cursor(query, sort: str, order: str, cursor: str):
+    """Условие keyset-пагинации; NULL-значения due_date идут в конце при asc и в начале при desc"""
+    value, last_id = _decode_todo_cursor(cursor, sort, order)
+    column = TODO_SORT_COLUMNS[sort]
+    if order == "asc":
+        if value is None:
+            return query.filter(column.is_(None), models.Todo.id > last_id)
+        return query.filter(or_(
+            column > value,
+            and_(column == value, models.Todo.id > last_id),
+            column.is_(None),
+        ))
+    if value is None:
+        return query.filter(or_(
+            and_(column.is_(None), models.Todo.id < last_id),
+            column.is_not(None),
+        ))
+    return query.filter(or_(column < value, and_(column == value, models.Todo.id < last_id)))
+
+# поля schemas.Todo в порядке схемы и наборы полей для view=
+TODO_FIELDS = (
+    "title", "description", "priority", "due_date", "id", "completed",
+    "user_id", "created_at", "updated_at", "category", "tags",
+)
+TODO_VIEWS = {
+    "full": TODO_FIELDS,
+    "summary": ("title", "priority", "due_date", "id", "completed", "created_at", "category", "tags"),
+}
+
+def todo_fields(view: schemas.TodoView = "full", fields: str | None = None) -> tuple[str, ...]:
+    """Поля ответа: явный список fields=a,b или набор view"""
+    if not fields:
+        return TODO_VIEWS[view]
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(TODO_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in TODO_FIELDS if name in requested)
+
+def _todo_rows_query(user_id: int, fields: tuple[str, ...]):
+    """Только нужные колонки задачи (и категории), без сборки ORM-объектов"""
+    columns = [getattr(models.Todo, name) for name in fields if name not in ("category", "tags")]
+    query = select(*columns)
+    if "category" in fields:
+        query = query.add_columns(models.Category.id, models.Category.name, models.Category.color).outerjoin(
+            models.Category, models.Category.id == models.Todo.category_id
+        )
+    return query.select_from(models.Todo).filter(models.Todo.user_id == user_id)
+
+async def _todo_dicts(db: AsyncSession, query, fields: tuple[str, ...]) -> list[dict]:
+    """Задачи в виде словарей в формате schemas.Todo: строки плюс один запрос тегов на 500 задач"""
+    rows = (await db.execute(query)).all()
+    scalar_fields = [name for name in fields if name not in ("category", "tags")]
+    id_index = scalar_fields.index("id")
 
-    if todo.category_id is not None:
-        category = (
-            db.query(models.Category)
-            .filter(
-                models.Category.id == todo.category_id,
-                models.Category.user_id == user_id,
+    tags_by_todo: dict[int, list[dict]] = {}
+    if "tags" in fields:
+        ids = [row[id_index] for row in rows]
+        for start in range(0, len(ids), 500):
+            result = await db.execute(
+                select(models.todo_tags.c.todo_id, models.Tag.id, models.Tag.name)
+                .join(models.Tag, models.Tag.id == models.todo_tags.c.tag_id)
+                .filter(models.todo_tags.c.todo_id.in_(ids[start:start + 500]))
             )
-            .first()
-        )
-        if category:
-            db_todo.category = category
-
-    tag_objs = []
-    for tag_name in todo.tags:
-        tag = (
-            db.query(models.Tag)
-            .filter(models.Tag.name == tag_name, models.Tag.user_id == user_id)
-            .first()
-        )
-        if not tag:
-            tag = models.Tag(name=tag_name, user_id=user_id)
-            db.add(tag)
-            db.commit()
-            db.refresh(tag)
-        tag_objs.append(tag)
-    if tag_objs:
-        db_todo.tags = tag_objs
+            for todo_id, tag_id, name in result:
+                tags_by_todo.setdefault(todo_id, []).append({"id": tag_id, "name": name})
+
+    todos = []
+    for row in rows:
+        todo = dict(zip(scalar_fields, row))
+        if "category" in fields:
+            category_id, name, color = row[len(scalar_fields):]
+            todo["category"] = None if category_id is None else {
+                "id": category_id,
+                "name": name,
+                "color": color,
+                "todo_count": 0,
+                "completed_count": 0,
+                "open_count": 0,
+                "overdue_count": 0,
+            }
+        if "tags" in fields:
+            todo["tags"] = tags_by_todo.get(row[id_index], [])
+        todos.append(todo)
+    return todos
+
+def _with_keys(fields: tuple[str, ...], sort: str | None) -> tuple[str, ...]:
+    """id и ключ сортировки нужны курсору, поэтому выбираются всегда"""
+    keys = {"id", sort} if sort else {"id"}
+    return tuple(name for name in TODO_FIELDS if name in fields or name in keys)
+
+async def get_todos(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    filters: schemas.TodoFilters | None = None,
+    sort: schemas.TodoSort = "created_at",
+    order: schemas.SortOrder = "asc",
+    cursor: str | None = None,
+    fields: tuple[str, ...] = TODO_FIELDS,
+):
+    """Страница задач в виде словарей (см. _todo_dicts) только с полями fields"""
+    fields = _with_keys(fields, sort)
+    query = _apply_todo_filters(_todo_rows_query(user_id, fields), filters)
+    return await _todo_dicts(db, _paginate_todos(query, skip, limit, sort, order, cursor), fields)
+
+def _paginate_todos(query, skip: int, limit: int, sort: str, order: str, cursor: str | None):
+    column = TODO_SORT_COLUMNS[sort]
+    if order == "asc":
+        query = query.order_by(column.asc().nulls_last(), models.Todo.id.asc())
+    else:
+        query = query.order_by(column.desc().nulls_first(), models.Todo.id.desc())
+
+    if cursor:
+        query = _apply_todo_cursor(query, sort, order, cursor)
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def _todo_search_match(db: AsyncSession, text: str):
+    """Условие поиска и выражение релевантности для текущего диалекта"""
+    if db.get_bind().dialect.name == "postgresql":
+        search_vector = literal_column("todos.search_vector")
+        ts_config = literal_column(f"'{models.TODO_SEARCH_CONFIG}'::regconfig")
+        ts_query = func.websearch_to_tsquery(ts_config, text)
+        return search_vector.op("@@")(ts_query), func.ts_rank_cd(search_vector, ts_query)
+
+    # запасной вариант для SQLite: все слова должны встречаться в title или description
+    terms = [term.lower() for term in text.split()]
+    if not terms:
+        return false(), literal(0)
+    title = func.lower(models.Todo.title)
+    description = func.lower(func.coalesce(models.Todo.description, ""))
+    condition = and_(*(
+        or_(title.contains(term, autoescape=True), description.contains(term, autoescape=True))
+        for term in terms
+    ))
+    rank = sum(
+        case((title.contains(term, autoescape=True), 2), else_=0)
+        + case((description.contains(term, autoescape=True), 1), else_=0)
+        for term in terms
+    )
+    return condition, rank
+
+async def search_todos(
+    db: AsyncSession,
+    user_id: int,
+    text: str,
+    skip: int = 0,
+    limit: int = 100,
+    filters: schemas.TodoFilters | None = None,
+    sort: schemas.TodoSort | None = None,
+    order: schemas.SortOrder = "asc",
+    cursor: str | None = None,
+    fields: tuple[str, ...] = TODO_FIELDS,
+):
+    """Полнотекстовый поиск; без sort результаты упорядочены по релевантности"""
+    fields = _with_keys(fields, sort)
+    condition, rank = _todo_search_match(db, text)
+    query = _apply_todo_filters(_todo_rows_query(user_id, fields), filters).filter(condition)
+    if sort is not None:
+        query = _paginate_todos(query, skip, limit, sort, order, cursor)
+    else:
+        query = query.order_by(rank.desc(), models.Todo.id.desc()).offset(skip).limit(limit)
+
+    return await _todo_dicts(db, query, fields)
+
+async def stream_todo_texts(
+    db: AsyncSession, user_id: int, filters: schemas.TodoFilters | None = None, batch_size: int = 1000
+):
+    """Отдает пачки (title, description) через серверный курсор, не загружая все задачи в память"""
+    query = _apply_todo_filters(
+        select(models.Todo.title, models.Todo.description).filter(models.Todo.user_id == user_id),
+        filters,
+    ).order_by(models.Todo.id)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+async def _get_category(db: AsyncSession, category_id: int, user_id: int):
+    result = await db.execute(
+        select(models.Category).filter(
+            models.Category.id == category_id,
+            models.Category.user_id == user_id,
+        )
+    )
+    return result.scalars().first()
+
+def _insert(db: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+async def get_collection_version(db: AsyncSession, user_id: int, collection: str):
+    """Версия и время изменения списка пользователя: одна строка по первичному ключу"""
+    result = await db.execute(
+        select(models.CollectionVersion.version, models.CollectionVersion.updated_at).filter(
+            models.CollectionVersion.user_id == user_id,
+            models.CollectionVersion.collection == collection,
+        )
+    )
+    return result.first() or (0, None)
+
+async def _bump_versions(db: AsyncSession, user_id: int, *collections: str, sync: bool = True):
+    """Увеличивает версии списков в текущей транзакции и возвращает номер изменения для /sync.
+
+    Строка "sync" блокируется до коммита, поэтому записи одного пользователя идут
+    по очереди и номера растут в порядке коммитов. Вызывается до изменения строк.
+    """
+    names = (["sync"] if sync else []) + list(collections)
+    stmt = _insert(db, models.CollectionVersion).values(
+        [{"user_id": user_id, "collection": collection, "version": 1} for collection in names]
+    )
+    result = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "collection"],
+            set_={"version": models.CollectionVersion.version + 1, "updated_at": func.now()},
+        ).returning(models.CollectionVersion.collection, models.CollectionVersion.version)
+    )
+    return dict(result.all()).get("sync")
+
+def _add_tombstones(db: AsyncSession, user_id: int, collection: str, object_ids, sync_seq: int):
+    db.add_all(
+        models.SyncTombstone(user_id=user_id, collection=collection, object_id=object_id, sync_seq=sync_seq)
+        for object_id in object_ids
+    )
+
+def _todo_state(todo) -> tuple:
+    """Поля задачи, от которых зависят счетчики /stats"""
+    return models.Priority(todo.priority), bool(todo.completed), todo.due_date, todo.completed_on
+
+async def _update_stats(db: AsyncSession, user_id: int, removed=(), added=()):
+    """Переносит в todo_stats и todo_day_stats разницу между старыми и новыми состояниями задач.
+
+    Состояние - результат _todo_state. Не больше двух UPSERT на запись; просроченные
+    и сегодняшние задачи отдельно не хранятся, get_stats суммирует их по дням.
+    """
+    totals: dict[models.Priority, list[int]] = {}
+    days: dict[date, list[int]] = {}
+    _count_stats(totals, days, removed, added)
+    await _write_stats(db, user_id, totals, days)
+
+def _count_stats(totals: dict, days: dict, removed=(), added=()):
+    """Добавляет разницу состояний к накопленным totals (по приоритету) и days (по дню)"""
+    for sign, states in ((-1, removed), (1, added)):
+        for priority, completed, due_date, completed_on in states:
+            counts = totals.setdefault(priority, [0, 0])
+            counts[0] += sign
+            if completed:
+                counts[1] += sign
+                if completed_on is not None:
+                    days.setdefault(completed_on, [0, 0])[1] += sign
+            elif due_date is not None:
+                days.setdefault(due_date, [0, 0])[0] += sign
+
+async def _write_stats(db: AsyncSession, user_id: int, totals: dict, days: dict):
+    rows = [
+        {"user_id": user_id, "priority": priority, "total": total, "completed": completed}
+        for priority, (total, completed) in sorted(totals.items()) if total or completed
+    ]
+    if rows:
+        stmt = _insert(db, models.TodoStat).values(rows)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "priority"],
+            set_={
+                "total": models.TodoStat.total + stmt.excluded.total,
+                "completed": models.TodoStat.completed + stmt.excluded.completed,
+            },
+        ))
+    rows = [
+        {"user_id": user_id, "day": day, "due_open": due_open, "completed": completed}
+        for day, (due_open, completed) in sorted(days.items()) if due_open or completed
+    ]
+    if rows:
+        stmt = _insert(db, models.TodoDayStat).values(rows)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "day"],
+            set_={
+                "due_open": models.TodoDayStat.due_open + stmt.excluded.due_open,
+                "completed": models.TodoDayStat.completed + stmt.excluded.completed,
+            },
+        ))
+
+async def rebuild_stats(db: AsyncSession, user_ids: list[int]):
+    """Пересчитывает счетчики /stats пользователей по их задачам, например после массовой загрузки"""
+    todo = models.Todo
+    await db.execute(delete(models.TodoStat).filter(models.TodoStat.user_id.in_(user_ids)))
+    await db.execute(delete(models.TodoDayStat).filter(models.TodoDayStat.user_id.in_(user_ids)))
+    await db.execute(insert(models.TodoStat).from_select(
+        ["user_id", "priority", "total", "completed"],
+        select(todo.user_id, todo.priority, func.count(), func.count().filter(todo.completed.is_(True)))
+        .filter(todo.user_id.in_(user_ids))
+        .group_by(todo.user_id, todo.priority),
+    ))
+    days = union_all(
+        select(todo.user_id, todo.due_date.label("day"), literal(1).label("due_open"), literal(0).label("completed"))
+        .filter(todo.user_id.in_(user_ids), todo.completed.is_not(True), todo.due_date.is_not(None)),
+        select(todo.user_id, todo.completed_on, literal(0), literal(1))
+        .filter(todo.user_id.in_(user_ids), todo.completed.is_(True), todo.completed_on.is_not(None)),
+    ).subquery()
+    await db.execute(insert(models.TodoDayStat).from_select(
+        ["user_id", "day", "due_open", "completed"],
+        select(days.c.user_id, days.c.day, func.sum(days.c.due_open), func.sum(days.c.completed))
+        .group_by(days.c.user_id, days.c.day),
+    ))
+
+async def _resolve_tags(db: AsyncSession, tag_names: list[str], user_id: int, sync_seq: int):
+    """Находит или создает теги пачкой: один SELECT и, если нужно, один INSERT ... ON CONFLICT
+
+    Версию "tags" увеличивает вызывающий в том же _bump_versions, что выдал sync_seq.
+    """
+    names = list(dict.fromkeys(tag_names))
+    if not names:
+        return []
+
+    result = await db.execute(
+        select(models.Tag).filter(models.Tag.user_id == user_id, models.Tag.name.in_(names))
+    )
+    by_name = {tag.name: tag for tag in result.scalars()}
+
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        result = await db.execute(
+            _insert(db, models.Tag)
+            .values([{"name": name, "user_id": user_id, "sync_seq": sync_seq} for name in missing])
+            .on_conflict_do_nothing(index_elements=["user_id", "name"])
+            .returning(models.Tag)
+        )
+        by_name.update((tag.name, tag) for tag in result.scalars())
+
+        # строки, вставленные параллельным запросом, ON CONFLICT не возвращает
+        raced = [name for name in missing if name not in by_name]
+        if raced:
+            result = await db.execute(
+                select(models.Tag).filter(models.Tag.user_id == user_id, models.Tag.name.in_(raced))
+            )
+            by_name.update((tag.name, tag) for tag in result.scalars())
+
+    return [by_name[name] for name in names]
+
+async def create_todo(db: AsyncSession, todo: schemas.TodoCreate, user_id: int):
+    # в GET /tags есть число задач у тегов
+    sync_seq = await _bump_versions(db, user_id, "todos", "categories", *(["tags"] if todo.tags else []))
+    data = todo.model_dump(exclude={"tags", "category_id"})
+    db_todo = models.Todo(**data, user_id=user_id, sync_seq=sync_seq)
+    db_todo.tags = await _resolve_tags(db, todo.tags, user_id, sync_seq)
+    db_todo.category = (
+        await _get_category(db, todo.category_id, user_id) if todo.category_id is not None else None
+    )
+    await _update_stats(db, user_id, added=[_todo_state(db_todo)])
 
     db.add(db_todo)
-    db.commit()
-    db.refresh(db_todo)
+    await db.commit()
+    events.publish(user_id, "todos", "created", [db_todo.id], sync_seq)
     return db_todo
 
-def update_todo(db: Session, todo_id: int, todo_update: schemas.TodoUpdate, user_id: int):
-    db_todo = db.query(models.Todo).filter(models.Todo.id == todo_id, models.Todo.user_id == user_id).first()
+async def update_todo(db: AsyncSession, todo_id: int, todo_update: schemas.TodoUpdate, user_id: int):
+    db_todo = await get_todo(db, todo_id, user_id)
 
     if db_todo:
-        update_data = todo_update.model_dump(exclude_unset=True, exclude={"tags"})
+        db_todo.sync_seq = await _bump_versions(
+            db, user_id, "todos", "categories", *(["tags"] if todo_update.tags is not None else [])
+        )
+        old_state = _todo_state(db_todo)
+        update_data = todo_update.model_dump(exclude_unset=True, exclude={"tags", "category_id"})
+        if "completed" in update_data and bool(update_data["completed"]) != old_state[1]:
+            update_data["completed_on"] = date.today() if update_data["completed"] else None
         for key, value in update_data.items():
             setattr(db_todo, key, value)
 
-        if "category_id" in todo_update.model_dump(exclude_unset=True):
+        if "category_id" in todo_update.model_fields_set:
             if todo_update.category_id is None:
                 db_todo.category = None
             else:
-                category = (
-                    db.query(models.Category)
-                    .filter(
-                        models.Category.id == todo_update.category_id,
-                        models.Category.user_id == user_id,
-                    )
-                    .first()
-                )
+                category = await _get_category(db, todo_update.category_id, user_id)
                 if category:
                     db_todo.category = category
 
         if todo_update.tags is not None:
-            tag_objs = []
-            for tag_name in todo_update.tags:
-                tag = (
-                    db.query(models.Tag)
-                    .filter(models.Tag.name == tag_name, models.Tag.user_id == user_id)
-                    .first()
-                )
-                if not tag:
-                    tag = models.Tag(name=tag_name, user_id=user_id)
-                    db.add(tag)
-                    db.commit()
-                    db.refresh(tag)
-                tag_objs.append(tag)
-            db_todo.tags = tag_objs
-
-        db.commit()
-        db.refresh(db_todo)
+            db_todo.tags = await _resolve_tags(db, todo_update.tags, user_id, db_todo.sync_seq)
+        await _update_stats(db, user_id, [old_state], [_todo_state(db_todo)])
+
+        await db.commit()
+        events.publish(user_id, "todos", "updated", [db_todo.id], db_todo.sync_seq)
     return db_todo
 
-def delete_todo(db: Session, todo_id: int, user_id: int):
-    db_todo = (
-        db.query(models.Todo)
-        .filter(models.Todo.id == todo_id, models.Todo.user_id == user_id)
-        .first()
+async def batch_todos(db: AsyncSession, operations: list[schemas.TodoBatchOperation], user_id: int):
+    """Выполняет пачку операций в одной транзакции.
+
+    Изменения полей группируются в UPDATE ... WHERE id IN, удаления - в один DELETE.
+    Для одной задачи операции применяются по порядку: create, update/complete, delete.
+    """
+    results: dict[int, schemas.TodoBatchItemResult] = {}
+    created, updated, deleted = [], [], set()
+    # состояния задач до и после пачки для счетчиков /stats
+    removed_states, added_states = [], []
+
+    def done(index, op, todo_id=None, status="ok", detail=None):
+        results[index] = schemas.TodoBatchItemResult(
+            index=index, op=op.op, id=todo_id, status=status, detail=detail
+        )
+
+    creates = [(i, op) for i, op in enumerate(operations) if op.op == "create"]
+    changes = [(i, op) for i, op in enumerate(operations) if op.op in ("update", "complete")]
+    deletes = [(i, op) for i, op in enumerate(operations) if op.op == "delete"]
+    payloads = [op.data for _, op in creates] + [op.data for _, op in changes if op.op == "update"]
+    # в GET /tags есть число задач у тегов
+    tags_changed = (
+        deletes or any(op.data.tags for _, op in creates)
+        or any(op.data.tags is not None for _, op in changes if op.op == "update")
     )
+    sync_seq = await _bump_versions(db, user_id, "todos", "categories", *(["tags"] if tags_changed else []))
+
+    # теги и категории всей пачки разрешаются одним запросом каждый
+    tag_names = [name for data in payloads if data.tags for name in data.tags]
+    tags_by_name = {tag.name: tag for tag in await _resolve_tags(db, tag_names, user_id, sync_seq)}
+    category_ids = {data.category_id for data in payloads if data.category_id is not None}
+    owned_categories = set()
+    if category_ids:
+        result = await db.execute(
+            select(models.Category.id).filter(
+                models.Category.user_id == user_id, models.Category.id.in_(category_ids)
+            )
+        )
+        owned_categories = set(result.scalars())
+
+    valid_creates = []
+    for i, op in creates:
+        if op.data.category_id is not None and op.data.category_id not in owned_categories:
+            done(i, op, status="error", detail="Category not found")
+            continue
+        valid_creates.append((i, op))
+    if valid_creates:
+        result = await db.execute(
+            insert(models.Todo).returning(models.Todo.id, sort_by_parameter_order=True),
+            [{**op.data.model_dump(exclude={"tags"}), "completed": False, "user_id": user_id, "sync_seq": sync_seq}
+             for _, op in valid_creates],
+        )
+        rows = []
+        for (i, op), todo_id in zip(valid_creates, result.scalars()):
+            done(i, op, todo_id)
+            created.append(todo_id)
+            added_states.append((op.data.priority, False, op.data.due_date, None))
+            rows.extend({"todo_id": todo_id, "tag_id": tags_by_name[name].id} for name in dict.fromkeys(op.data.tags))
+        if rows:
+            await db.execute(models.todo_tags.insert(), rows)
+
+    if changes:
+        result = await db.execute(
+            select(
+                models.Todo.id, models.Todo.priority, models.Todo.completed,
+                models.Todo.due_date, models.Todo.completed_on,
+            ).filter(models.Todo.user_id == user_id, models.Todo.id.in_({op.id for _, op in changes}))
+        )
+        owned_todos = {row.id: _todo_state(row) for row in result}
+
+        fields_by_todo: dict[int, dict] = {}
+        tags_by_todo: dict[int, list[int]] = {}
+        for i, op in changes:
+            if op.id not in owned_todos:
+                done(i, op, op.id, status="not_found", detail="Todo not found")
+                continue
+            if op.op == "complete":
+                fields = {"completed": op.completed}
+            else:
+                if op.data.category_id is not None and op.data.category_id not in owned_categories:
+                    done(i, op, op.id, status="error", detail="Category not found")
+                    continue
+                fields = op.data.model_dump(exclude_unset=True, exclude={"tags"})
+                if op.data.tags is not None:
+                    tags_by_todo[op.id] = [tags_by_name[name].id for name in dict.fromkeys(op.data.tags)]
+            fields_by_todo.setdefault(op.id, {"sync_seq": sync_seq}).update(fields)
+            done(i, op, op.id)
+
+        updated.extend(fields_by_todo)
+        today = date.today()
+        for todo_id, fields in fields_by_todo.items():
+            priority, completed, due_date, completed_on = owned_todos[todo_id]
+            if "completed" in fields and bool(fields["completed"]) != completed:
+                fields["completed_on"] = today if fields["completed"] else None
+            removed_states.append(owned_todos[todo_id])
+            added_states.append((
+                models.Priority(fields.get("priority", priority)),
+                bool(fields.get("completed", completed)),
+                fields.get("due_date", due_date),
+                fields.get("completed_on", completed_on),
+            ))
+
+        groups: dict[tuple, list[int]] = {}
+        for todo_id, fields in fields_by_todo.items():
+            groups.setdefault(tuple(sorted(fields.items())), []).append(todo_id)
+        for fields, todo_ids in groups.items():
+            await db.execute(
+                update(models.Todo)
+                .filter(models.Todo.user_id == user_id, models.Todo.id.in_(todo_ids))
+                .values(dict(fields))
+                .execution_options(synchronize_session=False)
+            )
+
+        if tags_by_todo:
+            await db.execute(delete(models.todo_tags).filter(models.todo_tags.c.todo_id.in_(tags_by_todo)))
+            rows = [
+                {"todo_id": todo_id, "tag_id": tag_id}
+                for todo_id, tag_ids in tags_by_todo.items()
+                for tag_id in tag_ids
+            ]
+            if rows:
+                await db.execute(models.todo_tags.insert(), rows)
+
+    if deletes:
+        delete_ids = {op.id for _, op in deletes}
+        owned = (
+            select(models.Todo.id)
+            .filter(models.Todo.user_id == user_id, models.Todo.id.in_(delete_ids))
+            .scalar_subquery()
+        )
+        await db.execute(delete(models.todo_tags).filter(models.todo_tags.c.todo_id.in_(owned)))
+        result = await db.execute(
+            delete(models.Todo)
+            .filter(models.Todo.user_id == user_id, models.Todo.id.in_(delete_ids))
+            .returning(
+                models.Todo.id, models.Todo.priority, models.Todo.completed,
+                models.Todo.due_date, models.Todo.completed_on,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        deleted = {row.id for row in rows}
+        removed_states.extend(_todo_state(row) for row in rows)
+        _add_tombstones(db, user_id, "todos", deleted, sync_seq)
+        for i, op in deletes:
+            if op.id in deleted:
+                done(i, op, op.id)
+            else:
+                done(i, op, op.id, status="not_found", detail="Todo not found")
+
+    await _update_stats(db, user_id, removed_states, added_states)
+    await db.commit()
+    events.publish(user_id, "todos", "created", created, sync_seq)
+    events.publish(user_id, "todos", "updated", [todo_id for todo_id in updated if todo_id not in deleted], sync_seq)
+    events.publish(user_id, "todos", "deleted", sorted(deleted), sync_seq)
+    return [results[i] for i in sorted(results)]
+
+async def delete_todo(db: AsyncSession, todo_id: int, user_id: int):
+    db_todo = await get_todo(db, todo_id, user_id)
 
     if db_todo:
         todo_data = schemas.Todo.model_validate(db_todo)
-        db.delete(db_todo)
-        db.commit()
+        todo_id = db_todo.id
+        sync_seq = await _bump_versions(db, user_id, "todos", "categories", *(["tags"] if db_todo.tags else []))
+        _add_tombstones(db, user_id, "todos", [todo_id], sync_seq)
+        await _update_stats(db, user_id, removed=[_todo_state(db_todo)])
+        await db.delete(db_todo)
+        await db.commit()
+        events.publish(user_id, "todos", "deleted", [todo_id], sync_seq)
         return todo_data
 
     return None
 
+async def import_todos(db: AsyncSession, rows, user_id: int, summary: schemas.TodoImportResult):
+    """Запись проверенных строк импорта (TodoImportRow из importer.staged_rows) одной транзакцией.
 
-def get_categories(db: Session, user_id: int):
-    categories = (
-        db.query(models.Category)
+    Файл к этому моменту прочитан целиком (importer.stage), поэтому транзакция и
+    блокировка строки "sync" в collection_versions длятся только время вставки, а не
+    загрузки. Строки вставляются пачками по IMPORT_BATCH_SIZE (executemany с RETURNING id),
+    связи с тегами - одним executemany на пачку. Новые категории и теги создаются по именам
+    пачкой, счетчики /stats записываются одним-двумя UPSERT в конце. summary.dry_run
+    выполняет все то же самое и откатывает транзакцию.
+    """
+    sync_seq = await _bump_versions(db, user_id, "todos", "categories", "tags")
+    # у категорий нет уникальности имени: берется самая старая с таким именем
+    result = await db.execute(
+        select(models.Category.id, models.Category.name)
         .filter(models.Category.user_id == user_id)
-        .all()
+        .order_by(models.Category.id.desc())
+    )
+    category_ids = {name: category_id for category_id, name in result}
+    tag_ids: dict[str, int] = {}
+    created_todos: list[int] | None = []
+    created_categories: list[int] = []
+    # счетчики /stats копятся за весь импорт: не больше строк, чем приоритетов и разных дней
+    totals: dict[models.Priority, list[int]] = {}
+    days: dict[date, list[int]] = {}
+
+    batch: list[schemas.TodoImportRow] = []
+
+    async def flush():
+        nonlocal created_todos
+        today = date.today()
+        states = [(row.priority, row.completed, row.due_date, today if row.completed else None) for row in batch]
+        todo_ids = await _import_batch(
+            db, batch, states, user_id, sync_seq, category_ids, tag_ids, summary, created_categories
+        )
+        _count_stats(totals, days, added=states)
+        if created_todos is not None and len(created_todos) + len(todo_ids) <= IMPORT_EVENT_MAX_IDS:
+            created_todos.extend(todo_ids)
+        else:
+            created_todos = None
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) == IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    await _write_stats(db, user_id, totals, days)
+
+    if summary.dry_run:
+        await db.rollback()
+        return summary
+    await db.commit()
+    events.publish(user_id, "categories", "created", created_categories, sync_seq)
+    if summary.imported:
+        events.publish(user_id, "todos", "created", created_todos, sync_seq)
+    return summary
+
+async def _import_batch(
+        db: AsyncSession, batch: list[schemas.TodoImportRow], states: list[tuple], user_id: int, sync_seq: int,
+        category_ids: dict[str, int], tag_ids: dict[str, int], summary: schemas.TodoImportResult,
+        created_categories: list[int],
+):
+    """Вставляет пачку строк импорта (states - их _todo_state) и возвращает id созданных задач"""
+    names = sorted({row.category for row in batch if row.category and row.category not in category_ids})
+    if names:
+        table = models.Category.__table__
+        result = await db.execute(
+            insert(table).returning(table.c.id, table.c.name, sort_by_parameter_order=True),
+            [{"name": name, "user_id": user_id, "sync_seq": sync_seq} for name in names],
+        )
+        for category_id, name in result:
+            category_ids[name] = category_id
+            created_categories.append(category_id)
+        summary.categories_created += len(names)
+
+    names = list(dict.fromkeys(name for row in batch for name in row.tags if name not in tag_ids))
+    for tag in await _resolve_tags(db, names, user_id, sync_seq):
+        tag_ids[tag.name] = tag.id
+        summary.tags_created += tag.sync_seq == sync_seq
+
+    table = models.Todo.__table__
+    # insertmanyvalues: в PostgreSQL пачка уходит одним INSERT с RETURNING, id сопоставляются
+    # строкам по порядку; SQLite так не умеет и вставляет по строке
+    result = await db.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        [
+            {
+                "title": row.title,
+                "description": row.description,
+                "priority": priority,
+                "due_date": due_date,
+                "completed": completed,
+                "completed_on": completed_on,
+                "category_id": category_ids[row.category] if row.category else None,
+                "user_id": user_id,
+                "sync_seq": sync_seq,
+            }
+            for row, (priority, completed, due_date, completed_on) in zip(batch, states)
+        ],
     )
-    for cat in categories:
-        cat.todo_count = len(cat.todos)
+    todo_ids = result.scalars().all()
+    links = [
+        {"todo_id": todo_id, "tag_id": tag_ids[name]}
+        for row, todo_id in zip(batch, todo_ids)
+        for name in dict.fromkeys(row.tags)
+    ]
+    if links:
+        await db.execute(models.todo_tags.insert(), links)
+    summary.imported += len(batch)
+    return todo_ids
+
+
+async def _get_categories_with_counts(db: AsyncSession, user_id: int, category_id: int | None = None):
+    """Категории со счетчиками задач, посчитанными одним GROUP BY запросом"""
+    query = (
+        select(
+            models.Category,
+            func.count(models.Todo.id),
+            func.count(models.Todo.id).filter(models.Todo.completed.is_(True)),
+            func.count(models.Todo.id).filter(
+                models.Todo.completed.is_not(True), models.Todo.due_date < date.today()
+            ),
+        )
+        .outerjoin(
+            models.Todo,
+            and_(models.Todo.category_id == models.Category.id, models.Todo.user_id == user_id),
+        )
+        .filter(models.Category.user_id == user_id)
+        .group_by(models.Category.id)
+        .order_by(models.Category.id)
+    )
+    if category_id is not None:
+        query = query.filter(models.Category.id == category_id)
+
+    result = await db.execute(query)
+    categories = []
+    for category, todo_count, completed_count, overdue_count in result.all():
+        category.todo_count = todo_count
+        category.completed_count = completed_count
+        category.open_count = todo_count - completed_count
+        category.overdue_count = overdue_count
+        categories.append(category)
     return categories
 
+async def get_categories(db: AsyncSession, user_id: int):
+    return await _get_categories_with_counts(db, user_id)
 
-def create_category(db: Session, name: str, color: str, user_id: int):
-    existing = (
-        db.query(models.Category)
+
+async def create_category(db: AsyncSession, name: str, color: str, user_id: int):
+    result = await db.execute(
+        select(models.Category)
         .filter(models.Category.name == name, models.Category.user_id == user_id)
-        .first()
     )
+    existing = result.scalars().first()
     if existing:
         return existing
-    category = models.Category(name=name, color=color, user_id=user_id)
+    sync_seq = await _bump_versions(db, user_id, "categories")
+    category = models.Category(name=name, color=color, user_id=user_id, sync_seq=sync_seq)
     db.add(category)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    events.publish(user_id, "categories", "created", [category.id], sync_seq)
     return category
 
-def update_category(
-    db: Session, category_id: int, user_id: int, name: str | None = None, color: str | None = None
+async def update_category(
+    db: AsyncSession, category_id: int, user_id: int, name: str | None = None, color: str | None = None
 ):
-    category = (
-        db.query(models.Category)
-        .filter(models.Category.id == category_id, models.Category.user_id == user_id)
-        .first()
-    )
+    category = await _get_category(db, category_id, user_id)
     if category:
+        # категория встроена в ответы со списком задач и в задачи ленты /sync:
+        # ее задачи получают тот же номер изменения, чтобы клиент забрал новое имя и цвет
+        category.sync_seq = await _bump_versions(db, user_id, "todos", "categories")
         if name is not None:
             category.name = name
         if color is not None:
             category.color = color
-        db.commit()
-        db.refresh(category)
+        result = await db.execute(
+            update(models.Todo)
+            .filter(models.Todo.category_id == category_id, models.Todo.user_id == user_id)
+            .values(sync_seq=category.sync_seq)
+            .returning(models.Todo.id)
+            .execution_options(synchronize_session=False)
+        )
+        restamped = result.scalars().all()
+        await db.commit()
+        events.publish(user_id, "categories", "updated", [category_id], category.sync_seq)
+        events.publish(user_id, "todos", "updated", restamped, category.sync_seq)
+        category, = await _get_categories_with_counts(db, user_id, category_id)
     return category
 
 
-def delete_category(
-    db: Session, category_id: int, user_id: int, new_category_id: int | None = None
+async def delete_category(
+    db: AsyncSession, category_id: int, user_id: int, new_category_id: int | None = None
 ):
-    category = (
-        db.query(models.Category)
-        .filter(models.Category.id == category_id, models.Category.user_id == user_id)
-        .first()
-    )
+    category = await _get_category(db, category_id, user_id)
     if category:
-        if new_category_id:
-            db.query(models.Todo).filter(
-                models.Todo.category_id == category_id, models.Todo.user_id == user_id
-            ).update({"category_id": new_category_id})
-        else:
-            db.query(models.Todo).filter(
-                models.Todo.category_id == category_id, models.Todo.user_id == user_id
-            ).update({"category_id": None})
-        db.delete(category)
-        db.commit()
+        sync_seq = await _bump_versions(db, user_id, "todos", "categories")
+        result = await db.execute(
+            update(models.Todo)
+            .filter(models.Todo.category_id == category_id, models.Todo.user_id == user_id)
+            .values(category_id=new_category_id or None, sync_seq=sync_seq)
+            .returning(models.Todo.id)
+            .execution_options(synchronize_session=False)
+        )
+        reassigned = result.scalars().all()
+        _add_tombstones(db, user_id, "categories", [category.id], sync_seq)
+        await db.delete(category)
+        await db.commit()
+        events.publish(user_id, "categories", "deleted", [category_id], sync_seq)
+        events.publish(user_id, "todos", "updated", reassigned, sync_seq)
     return category
 
 
-def get_tags(db: Session, user_id: int):
-    return db.query(models.Tag).filter(models.Tag.user_id == user_id).all()
+async def get_tags(
+        db: AsyncSession, user_id: int, prefix: str | None = None, limit: int | None = None, sort: str = "name"
+):
+    """Теги пользователя с числом задач; prefix - начало имени без учета регистра.
+
+    Отбор по префиксу идет по индексу (user_id, lower(name) text_pattern_ops).
+    При sort="name" limit применяется до подсчета, и считаются задачи только
+    у возвращаемых тегов; "popular" считает все подходящие теги и берет самые частые.
+    """
+    tags = select(models.Tag.id, models.Tag.name).filter(models.Tag.user_id == user_id)
+    if prefix:
+        escaped = prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        tags = tags.filter(func.lower(models.Tag.name).like(f"{escaped}%", escape="\\"))
+    if sort == "name" and limit is not None:
+        tags = tags.order_by(func.lower(models.Tag.name), models.Tag.id).limit(limit)
+    tags = tags.subquery()
+
+    todo_count = func.count(models.todo_tags.c.todo_id)
+    stmt = (
+        select(tags.c.id, tags.c.name, todo_count.label("todo_count"))
+        .outerjoin(models.todo_tags, models.todo_tags.c.tag_id == tags.c.id)
+        .group_by(tags.c.id, tags.c.name)
+    )
+    if sort == "popular":
+        stmt = stmt.order_by(todo_count.desc(), func.lower(tags.c.name), tags.c.id).limit(limit)
+    else:
+        stmt = stmt.order_by(func.lower(tags.c.name), tags.c.id)
+    result = await db.execute(stmt)
+    return result.all()
 
 
-def create_tag(db: Session, name: str, user_id: int):
-    existing = (
-        db.query(models.Tag)
-        .filter(models.Tag.name == name, models.Tag.user_id == user_id)
-        .first()
+async def create_tag(db: AsyncSession, name: str, user_id: int):
+    # существующий тег возвращается без новых версий: кеш списков и ETag остаются в силе
+    result = await db.execute(
+        select(models.Tag).filter(models.Tag.user_id == user_id, models.Tag.name == name)
     )
+    existing = result.scalars().first()
     if existing:
         return existing
-    tag = models.Tag(name=name, user_id=user_id)
-    db.add(tag)
-    db.commit()
-    db.refresh(tag)
+    sync_seq = await _bump_versions(db, user_id, "tags")
+    tag, = await _resolve_tags(db, [name], user_id, sync_seq)
+    await db.commit()
+    if tag.sync_seq == sync_seq:
+        events.publish(user_id, "tags", "created", [tag.id], sync_seq)
     return tag
+
+
+# порядок строк внутри одного номера изменения: категории раньше ссылающихся на них задач
+SYNC_TABLES = (
+    ("categories", models.Category),
+    ("tags", models.Tag),
+    ("todos", models.Todo),
+    ("deleted", models.SyncTombstone),
+)
+
+def _encode_sync_cursor(seq: int, position: tuple[int, int] | None = None) -> str:
+    """Номер изменения, если страница закончилась на его границе, иначе еще таблица и id последней строки"""
+    if position is None:
+        return str(seq)
+    rank, row_id = position
+    return f"{seq}-{SYNC_TABLES[rank][0]}-{row_id}"
+
+def _decode_sync_cursor(cursor: str) -> tuple[int, tuple[int, int] | None]:
+    try:
+        seq, _, rest = cursor.partition("-")
+        seq = int(seq)
+        if seq < 0:
+            raise ValueError
+        if not rest:
+            return seq, None
+        name, row_id = rest.rsplit("-", 1)
+        return seq, ([name for name, _ in SYNC_TABLES].index(name), int(row_id))
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+
+def _sync_after(table, rank: int, seq: int, position: tuple[int, int] | None):
+    """Строки таблицы после курсора в порядке (sync_seq, таблица, id)"""
+    if position is None or rank < position[0]:
+        return table.sync_seq > seq
+    if rank > position[0]:
+        return table.sync_seq >= seq
+    return or_(table.sync_seq > seq, and_(table.sync_seq == seq, table.id > position[1]))
+
+def _sync_until(table, rank: int, seq: int, position: tuple[int, int] | None):
+    """Строки таблицы до курсора включительно"""
+    if position is None or rank < position[0]:
+        return table.sync_seq <= seq
+    if rank > position[0]:
+        return table.sync_seq < seq
+    return or_(table.sync_seq < seq, and_(table.sync_seq == seq, table.id <= position[1]))
+
+async def get_changes(db: AsyncSession, user_id: int, since: str | None, limit: int):
+    """Изменения задач, категорий и тегов после курсора since, не больше limit строк.
+
+    Строки упорядочены по (номер изменения, таблица, id), поэтому limit соблюдается
+    и внутри одного номера: импорт или строки до миграции (у всех номер 0) отдаются
+    несколькими страницами. Транзакция может разойтись по страницам; клиент применяет
+    их по порядку, и после has_more=false его копия согласована.
+    """
+    since_seq, position = _decode_sync_cursor(since) if since is not None else (-1, None)
+    result = await db.execute(
+        select(models.CollectionVersion.collection, models.CollectionVersion.version).filter(
+            models.CollectionVersion.user_id == user_id,
+            models.CollectionVersion.collection.in_(["sync", "sync_purged"]),
+        )
+    )
+    versions = dict(result.all())
+    latest = versions.get("sync", 0)
+    purged = versions.get("sync_purged", -1)
+    # курсор внутри номера purged: часть его удалений могла быть удалена очисткой
+    reset = since is None or since_seq < purged or (position is not None and since_seq == purged)
+    if reset:
+        since_seq, position = -1, None
+    changes = {
+        "cursor": _encode_sync_cursor(latest), "has_more": False, "reset": reset,
+        "todos": [], "categories": [], "tags": [], "deleted": {"todos": [], "categories": []},
+    }
+    if position is None and since_seq >= latest:
+        return changes
+
+    tables = [(rank, table) for rank, (_, table) in enumerate(SYNC_TABLES) if not (reset and table is models.SyncTombstone)]
+    keys = union_all(*(
+        select(table.sync_seq.label("seq"), literal(rank).label("rank"), table.id.label("id")).filter(
+            table.user_id == user_id, _sync_after(table, rank, since_seq, position), table.sync_seq <= latest
+        )
+        for rank, table in tables
+    )).subquery()
+    result = await db.execute(
+        select(keys.c.seq, keys.c.rank, keys.c.id)
+        .order_by(keys.c.seq, keys.c.rank, keys.c.id).offset(limit - 1).limit(2)
+    )
+    edge = result.all()
+    upper, upper_position = latest, None
+    if len(edge) == 2:
+        (upper, rank, row_id), following = edge
+        # страница кончается на границе номера - курсор остается числом
+        if following.seq == upper:
+            upper_position = (rank, row_id)
+        changes["has_more"] = True
+    changes["cursor"] = _encode_sync_cursor(upper, upper_position)
+
+    def in_page(table):
+        rank = next(rank for rank, (_, candidate) in enumerate(SYNC_TABLES) if candidate is table)
+        return and_(
+            table.user_id == user_id,
+            _sync_after(table, rank, since_seq, position),
+            _sync_until(table, rank, upper, upper_position),
+        )
+
+    changes["todos"] = await _todo_dicts(
+        db, _todo_rows_query(user_id, TODO_FIELDS).filter(in_page(models.Todo)).order_by(models.Todo.id), TODO_FIELDS
+    )
+    result = await db.execute(
+        select(models.Category.id, models.Category.name, models.Category.color)
+        .filter(in_page(models.Category)).order_by(models.Category.id)
+    )
+    changes["categories"] = [row._asdict() for row in result]
+    result = await db.execute(
+        select(models.Tag.id, models.Tag.name).filter(in_page(models.Tag)).order_by(models.Tag.id)
+    )
+    changes["tags"] = [row._asdict() for row in result]
+    if not reset:
+        result = await db.execute(
+            select(models.SyncTombstone.collection, models.SyncTombstone.object_id)
+            .filter(in_page(models.SyncTombstone)).order_by(models.SyncTombstone.id)
+        )
+        for collection, object_id in result:
+            changes["deleted"][collection].append(object_id)
+    return changes
+
+
+async def purge_sync_tombstones(
+    db: AsyncSession, retention_days: int = SYNC_TOMBSTONE_RETENTION_DAYS, batch_size: int = 1000
+) -> int:
+    """Удаляет старые записи об удалениях пачками и запоминает для пользователей границу "sync_purged"
+
+    Клиент, чей курсор меньше границы, мог пропустить удаление и получит reset.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        expired = (
+            select(models.SyncTombstone.id)
+            .filter(models.SyncTombstone.deleted_at < cutoff)
+            .limit(batch_size)
+        )
+        result = await db.execute(
+            delete(models.SyncTombstone)
+            .filter(models.SyncTombstone.id.in_(expired))
+            .returning(models.SyncTombstone.user_id, models.SyncTombstone.sync_seq)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        horizons: dict[int, int] = {}
+        for user_id, sync_seq in rows:
+            horizons[user_id] = max(horizons.get(user_id, 0), sync_seq)
+        if horizons:
+            stmt = _insert(db, models.CollectionVersion).values([
+                {"user_id": user_id, "collection": "sync_purged", "version": sync_seq}
+                for user_id, sync_seq in horizons.items()
+            ])
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=["user_id", "collection"],
+                set_={"version": case(
+                    (stmt.excluded.version > models.CollectionVersion.version, stmt.excluded.version),
+                    else_=models.CollectionVersion.version,
+                )},
+            ))
+        await db.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
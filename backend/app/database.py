@@ -1,23 +1,121 @@
 import os
+import time
 
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from . import metrics, profiling
 
 load_dotenv()
 
 DATABASE_URL = f"postgresql://{os.getenv('DB_USER', 'todouser')}:{os.getenv('DB_PASSWORD', 'todopass')}@{os.getenv('DB_HOST', 'localhost')}/{os.getenv('DB_NAME', 'tododb')}"
 
-engine = create_engine(DATABASE_URL)
+# asyncpg в проде; для тестов можно указать sqlite+aiosqlite:///./test.db
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1),
+)
+
+# Пул на каждый воркер gunicorn: workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) должно
+# помещаться в max_connections Postgres
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 - без ограничения
+# за pgbouncer в режиме transaction пулом управляет pgbouncer
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который пишет время ожидания соединения и таймауты в метрики"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def _engine_options(url: str) -> dict:
+    if make_url(url).get_backend_name() != "postgresql":
+        return {}
+
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    connect_args = {}
+    if DB_PGBOUNCER:
+        # NullPool и уникальные имена prepared statements: соединение с сервером
+        # меняется от транзакции к транзакции
+        options["poolclass"] = NullPool
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{os.urandom(8).hex()}__"
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    options["connect_args"] = connect_args
+    return options
+
+
+engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+
+if DB_PGBOUNCER and DB_STATEMENT_TIMEOUT_MS and engine.dialect.name == "postgresql":
+    # pgbouncer не пропускает параметры запуска, поэтому таймаут ставится на каждую транзакцию
+    @event.listens_for(engine.sync_engine, "begin")
+    def _set_statement_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+def report_pool_size() -> None:
+    # вызывается из lifespan: мастер gunicorn тоже импортирует модуль (проверка схемы),
+    # но в сумму по живым процессам попадать не должен
+    if isinstance(engine.pool, AsyncAdaptedQueuePool):
+        metrics.DB_POOL_SIZE.set(engine.pool.size())
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.DB_POOL_IN_USE.inc()
+
+@event.listens_for(engine.sync_engine.pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    metrics.DB_POOL_IN_USE.dec()
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.record_query(duration)
+    profiling.record_statement(statement, duration)
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _on_error(context):
+    started = context.connection.info.get("query_started") if context.connection else None
+    if started:
+        duration = time.perf_counter() - started.pop()
+        metrics.record_query(duration)
+        profiling.record_statement(context.statement, duration)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
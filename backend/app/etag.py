@@ -0,0 +1,83 @@
+import hashlib
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import auth, crud, schemas
+from .database import get_db
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Слабое сравнение If-None-Match (RFC 9110, 13.1.2)"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def collection_etag(collection: str, daily: bool = False):
+    """Зависимость для GET списка: отдает ETag/Last-Modified и 304 без загрузки строк.
+
+    ETag строится из версии списка пользователя (crud увеличивает ее при каждой записи)
+    и строки запроса, поэтому разные фильтры и страницы не делят один ETag.
+    Эту же версию и ключ запроса использует кэш ответов (cache.cached_response).
+    daily - ответ зависит от текущей даты (просроченные задачи), версия меняется и в полночь.
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: schemas.User = Depends(auth.get_current_user),
+        db: AsyncSession = Depends(get_db),
+    ):
+        version, updated_at = await crud.get_collection_version(db, current_user.id, collection)
+
+        query = request.url.query
+        if daily:
+            query += f":{date.today()}"
+        digest = hashlib.blake2b(f"{current_user.id}:{version}:{query}".encode(), digest_size=8).hexdigest()
+        headers = {
+            "ETag": f'W/"{collection}-{version}-{digest}"',
+            "Cache-Control": "private, no-cache",
+            "Vary": "Authorization",
+        }
+
+        last_modified = None
+        if updated_at is not None:
+            # SQLite возвращает время без часового пояса, func.now() там в UTC
+            last_modified = updated_at if updated_at.tzinfo else updated_at.replace(tzinfo=timezone.utc)
+            if daily:
+                midnight = datetime.combine(date.today(), datetime.min.time()).astimezone(timezone.utc)
+                last_modified = max(last_modified, midnight)
+            headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, headers["ETag"])
+        else:
+            not_modified = (
+                if_modified_since is not None
+                and last_modified is not None
+                and _not_modified_since(if_modified_since, last_modified)
+            )
+        if not_modified:
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        # ключ кэша ответов не зависит от версии: устаревший ответ перезаписывается на месте
+        query_digest = hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+        request.state.response_cache = (f"response:{current_user.id}:{collection}:{query_digest}", collection, version)
+
+    return dependency
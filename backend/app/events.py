@@ -0,0 +1,291 @@
+"""События об изменениях для GET /events (Server-Sent Events).
+
+crud после коммита вызывает publish(); событие уходит в брокер этого процесса,
+который раздает его открытым потокам пользователя, и в бэкенд для остальных
+воркеров: Postgres LISTEN/NOTIFY или memory (один процесс, тесты, SQLite).
+Тем же каналом воркеры узнают об изменении пользователя (user_changed) и
+сбрасывают его запись в auth.user_cache.
+
+События - подсказки: клиент по ним вызывает GET /sync?since=<курсор>, а
+источник правды - лента /sync. Поэтому медленного клиента не ждут: очередь
+потока ограничена, при переполнении она очищается и клиент получает overflow.
+"""
+import asyncio
+import logging
+from contextlib import contextmanager
+from os import getenv
+
+import asyncpg
+import orjson
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from . import metrics
+from .database import ASYNC_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# auto - postgres, если база Postgres, иначе memory
+EVENTS_BACKEND = getenv("EVENTS_BACKEND", "auto")
+# LISTEN не работает через pgbouncer в режиме transaction: укажите прямое подключение
+EVENTS_DATABASE_URL = getenv("EVENTS_DATABASE_URL", ASYNC_DATABASE_URL)
+EVENTS_CHANNEL = getenv("EVENTS_CHANNEL", "todo_events")
+EVENTS_QUEUE_SIZE = int(getenv("EVENTS_QUEUE_SIZE", "64"))
+EVENTS_OUTBOX_SIZE = int(getenv("EVENTS_OUTBOX_SIZE", "10000"))
+EVENTS_HEARTBEAT_SECONDS = float(getenv("EVENTS_HEARTBEAT_SECONDS", "25"))
+EVENTS_RECONNECT_SECONDS = float(getenv("EVENTS_RECONNECT_SECONDS", "1"))
+
+# payload NOTIFY ограничен 8000 байт; длинный список id заменяется на null
+NOTIFY_MAX_PAYLOAD = 7900
+
+# служебное событие: пользователь изменен, в поток клиента не попадает
+USERS = "users"
+
+OVERFLOW = b"event: overflow\ndata: {}\n\n"
+HEARTBEAT = b": ping\n\n"
+CLOSED = None
+
+
+def _format(event: dict) -> bytes:
+    return b"id: %d\nevent: %s.%s\ndata: %s\n\n" % (
+        event["seq"], event["collection"].encode(), event["op"].encode(), orjson.dumps(event),
+    )
+
+
+class Subscription:
+    """Поток одного клиента: очередь готовых SSE-сообщений ограниченного размера"""
+
+    def __init__(self, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def put(self, message: bytes | None) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # клиент не успевает: пропущенное он заберет из /sync
+            dropped = [self.queue.get_nowait() for _ in range(self.queue.qsize())]
+            closed = message is CLOSED or CLOSED in dropped
+            self.queue.put_nowait(CLOSED if closed else OVERFLOW)
+            metrics.EVENT_OVERFLOWS.inc()
+
+
+class Broker:
+    """Раздача событий потокам внутри процесса: user_id -> открытые подписки"""
+
+    def __init__(self):
+        self._subscribers: dict[int, set[Subscription]] = {}
+
+    @contextmanager
+    def subscribe(self, user_id: int):
+        subscription = Subscription()
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        metrics.EVENT_STREAMS.inc()
+        try:
+            yield subscription
+        finally:
+            metrics.EVENT_STREAMS.dec()
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def deliver(self, user_id: int, event: dict) -> None:
+        subscribers = self._subscribers.get(user_id)
+        if subscribers:
+            message = _format(event)
+            for subscription in subscribers:
+                subscription.put(message)
+
+    def resync(self) -> None:
+        """События могли потеряться: всем потокам отправляется overflow"""
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.put(OVERFLOW)
+
+    def close(self) -> None:
+        """Завершает все потоки, чтобы остановка сервера их не ждала"""
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.put(CLOSED)
+
+
+broker = Broker()
+
+# обработчики изменения пользователя; user_id None - изменения могли быть пропущены, сбросить всё
+_user_listeners: list = []
+
+
+def on_user_changed(listener) -> None:
+    _user_listeners.append(listener)
+
+
+def _users_changed(user_id: int | None) -> None:
+    for listener in _user_listeners:
+        listener(user_id)
+
+
+def _dispatch(user_id: int, event: dict) -> None:
+    if event["collection"] == USERS:
+        _users_changed(user_id)
+    else:
+        broker.deliver(user_id, event)
+
+
+class MemoryBackend:
+    """События только внутри процесса: для одного воркера, тестов и SQLite"""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def publish(self, user_id: int, event: dict) -> None:
+        _dispatch(user_id, event)
+
+    async def publish_in_transaction(self, db, user_id: int, event: dict) -> None:
+        pass
+
+
+class PostgresBackend:
+    """Раздача между воркерами через LISTEN/NOTIFY на отдельном соединении asyncpg.
+
+    Своим потокам событие доставляется сразу, остальным воркерам - через NOTIFY;
+    собственные уведомления соединение пропускает по pid. publish() не ждет базу:
+    событие кладется в очередь, которую фоновая задача отправляет по одному NOTIFY.
+    """
+
+    def __init__(self, url: str, channel: str = EVENTS_CHANNEL):
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._outbox: asyncio.Queue = asyncio.Queue(EVENTS_OUTBOX_SIZE)
+        self._task: asyncio.Task | None = None
+        self._connected = False
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def publish(self, user_id: int, event: dict) -> None:
+        _dispatch(user_id, event)
+        if not self._connected:
+            metrics.EVENT_PUBLISH_DROPPED.inc()
+            return
+        try:
+            self._outbox.put_nowait((user_id, event))
+        except asyncio.QueueFull:
+            metrics.EVENT_PUBLISH_DROPPED.inc()
+
+    def _payload(self, user_id: int, event: dict) -> str:
+        payload = orjson.dumps({"user_id": user_id, **event})
+        if len(payload) > NOTIFY_MAX_PAYLOAD:
+            payload = orjson.dumps({"user_id": user_id, **event, "ids": None})
+        return payload.decode()
+
+    async def publish_in_transaction(self, db, user_id: int, event: dict) -> None:
+        """NOTIFY в транзакции db: доставляется только после ее коммита и не зависит от соединения LISTEN"""
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": self.channel, "payload": self._payload(user_id, event)},
+        )
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        if pid == connection.get_server_pid():
+            return
+        try:
+            event = orjson.loads(payload)
+            _dispatch(event.pop("user_id"), event)
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            logger.warning("malformed event on %s: %.200s", channel, payload)
+
+    async def _run(self) -> None:
+        reconnect = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(self.channel, self._on_notify)
+                self._connected = True
+                if reconnect:
+                    broker.resync()
+                    _users_changed(None)
+                while True:
+                    try:
+                        user_id, event = await asyncio.wait_for(self._outbox.get(), EVENTS_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        # без записей обрыв соединения иначе не заметить
+                        await connection.execute("SELECT 1")
+                        continue
+                    await connection.execute("SELECT pg_notify($1, $2)", self.channel, self._payload(user_id, event))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("event listener connection failed, reconnecting")
+            finally:
+                reconnect = True
+                # пока соединения нет, другие воркеры события не получат; клиенты догонят через /sync
+                self._connected = False
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(EVENTS_RECONNECT_SECONDS)
+
+
+def _create_backend():
+    name = EVENTS_BACKEND
+    if name == "auto":
+        name = "postgres" if make_url(EVENTS_DATABASE_URL).get_backend_name() == "postgresql" else "memory"
+    if name == "postgres":
+        return PostgresBackend(EVENTS_DATABASE_URL)
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown EVENTS_BACKEND: {EVENTS_BACKEND}")
+
+
+backend = _create_backend()
+
+
+def publish(user_id: int, collection: str, op: str, ids, seq: int) -> None:
+    """Вызывать после успешного коммита; ids - id измененных строк.
+
+    ids=None - строк слишком много для события (импорт), клиент забирает изменения через /sync.
+    """
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return
+    backend.publish(user_id, {"collection": collection, "op": op, "ids": ids, "seq": seq})
+
+
+async def user_changed(db, user_id: int) -> None:
+    """Вызывать до коммита транзакции, изменившей пользователя (пароль, активность, email).
+
+    С бэкендом postgres уведомление уходит в той же транзакции, поэтому другие воркеры
+    сбросят кеш после коммита, даже если пользователя изменил отдельный процесс (скрипт).
+    Кеш своего воркера сбрасывает auth.invalidate_user после коммита.
+    """
+    await backend.publish_in_transaction(db, user_id, {"collection": USERS, "op": "update", "ids": [user_id], "seq": 0})
+
+
+async def stream(user_id: int):
+    """Тело ответа text/event-stream; ping раз в EVENTS_HEARTBEAT_SECONDS держит прокси и NAT"""
+    with broker.subscribe(user_id) as subscription:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                # asyncio.timeout, в отличие от wait_for, не создает задачу на каждое ожидание
+                async with asyncio.timeout(EVENTS_HEARTBEAT_SECONDS):
+                    message = await subscription.queue.get()
+            except TimeoutError:
+                message = HEARTBEAT
+            if message is CLOSED:
+                return
+            yield message
@@ -0,0 +1,274 @@
+"""Потоковый разбор файла для POST /import: CSV, TSV (в том числе из /anki-export) и JSON.
+
+Тело запроса разбирается по мере чтения: в памяти только незавершенная запись
+(строка CSV с переносами внутри кавычек, объект JSON), поэтому расход памяти
+не зависит от размера файла. gzip (например, anki_*.tsv.gz) распознается по сигнатуре.
+Проверенные строки складываются во временный файл (stage), и база используется
+только после того, как клиент передал файл целиком.
+
+CSV и TSV - с заголовком; колонки title, description, priority, due_date, completed,
+category, tags (через запятую), Front/Back из выгрузки Anki читаются как title/description.
+JSON - массив объектов с теми же полями (tags - список или строка через запятую)
+или объекты по одному на строку (NDJSON).
+"""
+import codecs
+import csv
+import json
+import tempfile
+import zlib
+from os import getenv
+
+from pydantic import ValidationError
+
+from . import schemas
+
+# больше строк - импорт отменяется целиком: временный файл и транзакция записи не должны расти бесконечно
+IMPORT_MAX_ROWS = int(getenv("IMPORT_MAX_ROWS", "100000"))
+# сколько ошибок строк вернуть клиенту
+IMPORT_MAX_ERRORS = int(getenv("IMPORT_MAX_ERRORS", "100"))
+# временный файл с проверенными строками держится в памяти до этого размера, дальше - на диске (TMPDIR)
+IMPORT_SPOOL_MAX_MEMORY = int(getenv("IMPORT_SPOOL_MAX_MEMORY", str(8 * 2**20)))
+# самая длинная запись (строка CSV/TSV или объект JSON), в символах
+IMPORT_MAX_RECORD_SIZE = int(getenv("IMPORT_MAX_RECORD_SIZE", str(2**20)))
+
+MEDIA_TYPES = {
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv",
+    "application/json": "json",
+    "application/x-ndjson": "json",
+}
+COLUMNS = {
+    "title": "title",
+    "front": "title",
+    "description": "description",
+    "back": "description",
+    "priority": "priority",
+    "due_date": "due_date",
+    "completed": "completed",
+    "category": "category",
+    "tags": "tags",
+}
+
+
+class ImportFileError(ValueError):
+    """Файл не удается разобрать дальше: импорт отменяется целиком"""
+
+    def __init__(self, detail: str, status_code: int = 422):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+async def _decompressed(chunks):
+    decompressor = None
+    async for chunk in chunks:
+        if decompressor is None:
+            decompressor = zlib.decompressobj(wbits=31) if chunk.startswith(b"\x1f\x8b") else False
+        if decompressor:
+            try:
+                chunk = decompressor.decompress(chunk)
+            except zlib.error:
+                raise ImportFileError("Corrupted gzip data")
+        if chunk:
+            yield chunk
+
+
+async def _text(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        async for chunk in _decompressed(chunks):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFileError("File is not valid UTF-8")
+
+
+async def _line_batches(texts, quoted: bool):
+    """Списки строк с концами строк, по куску тела; запись CSV в кавычках не разрывается между списками"""
+    tail = ""
+    record: list[str] = []
+    # в записи CSV кавычки парные, нечетное число - перевод строки внутри поля
+    quotes = 0
+    async for text in texts:
+        lines = (tail + text).split("\n")
+        tail = lines.pop()
+        if len(tail) > IMPORT_MAX_RECORD_SIZE:
+            raise ImportFileError(f"Line is longer than {IMPORT_MAX_RECORD_SIZE} characters")
+        batch = []
+        for line in lines:
+            record.append(line + "\n")
+            if quoted:
+                quotes += line.count('"')
+                if quotes % 2:
+                    continue
+                quotes = 0
+            batch.extend(record)
+            record = []
+        if sum(map(len, record)) > IMPORT_MAX_RECORD_SIZE:
+            raise ImportFileError(f"Record is longer than {IMPORT_MAX_RECORD_SIZE} characters")
+        if batch:
+            yield batch
+    if quotes % 2:
+        raise ImportFileError("Unterminated quoted field at the end of the file")
+    record.append(tail)
+    yield record
+
+
+async def _delimited_records(texts, delimiter: str, quoted: bool):
+    """(номер строки начала записи, поля) для CSV и TSV; пустые строки пропускаются"""
+    offset = 0
+    async for lines in _line_batches(texts, quoted):
+        reader = csv.reader(lines, delimiter=delimiter, quoting=csv.QUOTE_MINIMAL if quoted else csv.QUOTE_NONE)
+        start = 0
+        try:
+            for fields in reader:
+                if any(fields):
+                    yield offset + start + 1, fields
+                start = reader.line_num
+        except csv.Error as e:
+            raise ImportFileError(f"Line {offset + start + 1}: {e}")
+        offset += len(lines)
+
+
+async def _delimited_rows(texts, delimiter: str, quoted: bool):
+    header = None
+    async for line, fields in _delimited_records(texts, delimiter, quoted):
+        if header is None:
+            header = [COLUMNS.get(name.strip().lower().replace(" ", "_")) for name in fields]
+            if "title" not in header:
+                raise ImportFileError("The header must contain a title column (or Front for Anki TSV)")
+            continue
+        values = {
+            column: value.strip() for column, value in zip(header, fields)
+            if column is not None and value.strip()
+        }
+        if not quoted:
+            # выгрузка Anki заменяет переводы строк на <br>
+            for column in ("title", "description"):
+                if column in values:
+                    values[column] = values[column].replace("<br>", "\n")
+        if "tags" in values:
+            values["tags"] = values["tags"].split(",")
+        yield line, values
+
+
+async def _json_rows(texts):
+    """Элементы массива JSON или значения NDJSON по одному; буфер держит только текущий элемент"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    array = None
+    expect_value = True
+    index = 0
+    finished = False
+    eof = False
+    iterator = aiter(texts)
+    while not finished:
+        try:
+            buffer += await anext(iterator)
+        except StopAsyncIteration:
+            eof = True
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if array is None:
+                array = char == "["
+                position += array
+                continue
+            if array and char == "]" and (index == 0 or not expect_value):
+                finished = True
+                position += 1
+                break
+            if array and not expect_value:
+                if char != ",":
+                    raise ImportFileError(f"Element {index}: expected ',' or ']'")
+                expect_value = True
+                position += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ImportFileError(f"Element {index + 1}: {e.msg}")
+                # элемент еще не пришел целиком
+                break
+            index += 1
+            position = end
+            expect_value = False
+            yield index, value
+        buffer = buffer[position:]
+        if len(buffer) > IMPORT_MAX_RECORD_SIZE:
+            raise ImportFileError(f"Element {index + 1} is longer than {IMPORT_MAX_RECORD_SIZE} characters")
+        if eof:
+            if array and not finished:
+                raise ImportFileError("Unexpected end of JSON array")
+            break
+    if buffer.strip():
+        raise ImportFileError("Unexpected data after the JSON array")
+
+
+def _validate(values) -> schemas.TodoImportRow | str:
+    if not isinstance(values, dict):
+        return "Expected an object"
+    # пустая строка в JSON-выгрузках других программ означает отсутствие значения, как пустая ячейка CSV
+    values = {key: value for key, value in values.items() if value != ""}
+    if isinstance(values.get("tags"), str):
+        values["tags"] = values["tags"].split(",")
+    try:
+        row = schemas.TodoImportRow.model_validate(values)
+    except ValidationError as e:
+        return "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}" if error["loc"] else error["msg"]
+            for error in e.errors(include_url=False)
+        )
+    row.tags = [name for name in (name.strip() for name in row.tags) if name]
+    return row
+
+
+async def parse(chunks, file_format: schemas.TodoImportFormat):
+    """(номер строки или элемента, TodoImportRow или текст ошибки) для каждой записи файла"""
+    texts = _text(chunks)
+    if file_format == "json":
+        records = _json_rows(texts)
+    else:
+        records = _delimited_rows(texts, "," if file_format == "csv" else "\t", quoted=file_format == "csv")
+    count = 0
+    async for line, values in records:
+        count += 1
+        if count > IMPORT_MAX_ROWS:
+            raise ImportFileError(f"The file has more than {IMPORT_MAX_ROWS} rows", status_code=413)
+        yield line, _validate(values)
+
+
+async def stage(rows, summary: schemas.TodoImportResult):
+    """Читает rows из parse до конца: ошибки - в summary, верные строки - во временный файл.
+
+    Пока клиент передает файл, база не используется: медленная загрузка не держит
+    соединение из пула и блокировку ленты /sync пользователя. Цена - копия
+    проверенных строк (JSON по строке на запись) в памяти или на диске.
+    """
+    staged = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY)
+    try:
+        async for line, row in rows:
+            summary.total += 1
+            if isinstance(row, str):
+                summary.failed += 1
+                if len(summary.errors) < IMPORT_MAX_ERRORS:
+                    summary.errors.append(schemas.TodoImportError(row=line, detail=row))
+                continue
+            staged.write(row.model_dump_json().encode() + b"\n")
+        staged.seek(0)
+    except BaseException:
+        staged.close()
+        raise
+    return staged
+
+
+def staged_rows(staged):
+    """Строки из файла stage по одной, без загрузки файла в память"""
+    for line in staged:
+        yield schemas.TodoImportRow.model_validate_json(line)
@@ -1,21 +1,80 @@
+import time
+
+# время импорта приложения входит в отчет о запуске воркера (startup.report_startup)
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+
 from dotenv import load_dotenv
 import os
 
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
-from . import models
-from .database import engine
-from .routes import todos, auth, categories, tags, anki_export
+from . import cache
+from .auth import REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS, purge_expired_refresh_tokens, shutdown_password_hasher
+from .crud import purge_sync_tombstones
+from .database import SessionLocal, engine, report_pool_size
+from .events import backend as event_backend, broker as event_broker
+from .metrics import MetricsMiddleware
+from .profiling import SQLProfilingMiddleware
+from .routes import todos, auth, categories, tags, anki_export, metrics, sync, events, stats, imports
+from .startup import prepare_schema, report_startup
 
 load_dotenv()
 
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+SYNC_TOMBSTONE_SWEEP_INTERVAL_SECONDS = float(os.getenv("SYNC_TOMBSTONE_SWEEP_INTERVAL_SECONDS", "3600"))
+
+
+async def run_periodically(interval: float, job):
+    """Фоновая задача: раз в interval секунд выполняет job(db) в своей сессии"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as db:
+                deleted = await job(db)
+            if deleted:
+                logger.info("%s deleted %d rows", job.__name__, deleted)
+        except Exception:
+            logger.exception("%s failed", job.__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # схема проверяется без рефлексии таблиц, режим задает DB_SCHEMA_STARTUP (см. startup.py)
+    await prepare_schema(engine)
+    report_pool_size()
+    jobs = [
+        asyncio.create_task(run_periodically(interval, job))
+        for interval, job in (
+            (REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS, purge_expired_refresh_tokens),
+            (SYNC_TOMBSTONE_SWEEP_INTERVAL_SECONDS, purge_sync_tombstones),
+        )
+        if interval > 0
+    ]
+    await event_backend.start()
+    report_startup(_import_duration, time.perf_counter() - started)
+    yield
+    event_broker.close()
+    await event_backend.stop()
+    await cache.close()
+    for job in jobs:
+        job.cancel()
+        with suppress(asyncio.CancelledError):
+            await job
+    shutdown_password_hasher()
+    await engine.dispose()
 
 app = FastAPI(
     title="Todo API",
     description="Fullstack Todo application with FastAPI and Nuxt",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan,
 )
 
 origins = [
@@ -30,14 +89,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "Server-Timing"],
 )
 
+app.add_middleware(SQLProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router)
 app.include_router(todos.router)
 app.include_router(categories.router)
 app.include_router(tags.router)
 app.include_router(anki_export.router)
+app.include_router(metrics.router)
+app.include_router(sync.router)
+app.include_router(events.router)
+app.include_router(stats.router)
+app.include_router(imports.router)
 
 @app.get("/")
 async def root():
     return {"message": "App is running"}
+
+_import_duration = time.perf_counter() - _import_started
@@ -0,0 +1,158 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Под gunicorn задайте PROMETHEUS_MULTIPROC_DIR: воркеры пишут метрики в mmap-файлы
+# этого каталога, а /metrics любого воркера собирает их вместе (см. gunicorn.conf.py)
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# пул соединений; gauge суммируются по живым воркерам gunicorn
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Соединения, выданные из пула", multiprocess_mode="livesum"
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size", "Настроенный размер пула (без overflow)", multiprocess_mode="livesum"
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула, включая открытие нового",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts", "Запросы, не дождавшиеся соединения за DB_POOL_TIMEOUT"
+)
+
+# HTTP: router - первый сегмент пути маршрута (todos, categories, tags, auth, anki-export)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса", ["router", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_REQUESTS = Counter(
+    "http_requests", "Запросы по статусу ответа", ["router", "method", "status"]
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL-запросов за HTTP-запрос", ["router"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+DB_DURATION_PER_REQUEST = Histogram(
+    "db_query_duration_per_request_seconds", "Суммарное время SQL за HTTP-запрос", ["router"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+
+# /events: открытые потоки и клиенты, не успевшие забрать события
+EVENT_STREAMS = Gauge(
+    "event_streams_open", "Открытые потоки GET /events", multiprocess_mode="livesum"
+)
+EVENT_OVERFLOWS = Counter(
+    "event_stream_overflows", "Переполнения очереди потока: клиенту отправлен overflow"
+)
+EVENT_PUBLISH_DROPPED = Counter(
+    "event_publish_dropped", "События, не отправленные другим воркерам (очередь NOTIFY полна или нет соединения)"
+)
+
+# кэш ответов GET списков; entries/bytes - только для RESPONSE_CACHE=memory
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests", "Обращения к кэшу ответов: hit или miss", ["collection", "result"]
+)
+RESPONSE_CACHE_ENTRIES = Gauge(
+    "response_cache_entries", "Записи в кэше ответов воркера", multiprocess_mode="livesum"
+)
+RESPONSE_CACHE_BYTES = Gauge(
+    "response_cache_bytes", "Размер записей в кэше ответов воркера", multiprocess_mode="livesum"
+)
+RESPONSE_CACHE_ENTRY_SIZE = Histogram(
+    "response_cache_entry_bytes", "Размер сохраняемого ответа",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+RESPONSE_CACHE_ERRORS = Counter(
+    "response_cache_errors", "Ошибки и таймауты Redis (считаются промахом)"
+)
+
+# кеш пользователей auth.user_cache, по воркеру
+USER_CACHE_HITS = Counter(
+    "user_cache_hits", "Пользователь запроса найден в кеше"
+)
+USER_CACHE_MISSES = Counter(
+    "user_cache_misses", "Пользователя нет в кеше или запись устарела: загрузка из базы"
+)
+
+# хеширование паролей (auth._run_hasher): очередь ждет свободного потока пула
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth", "Хеширования, ожидающие потока пула", multiprocess_mode="livesum"
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight", "Хеширования, выполняемые сейчас", multiprocess_mode="livesum"
+)
+PASSWORD_HASH_COMPLETED = Counter(
+    "password_hash_completed", "Завершенные хеширования и проверки паролей"
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected", "Отказы с 503: очередь длиннее PASSWORD_HASH_MAX_QUEUE"
+)
+
+# запуск воркера: phase - import (импорт app.main) или lifespan (подготовка схемы и фоновых задач);
+# по воркерам берется самый медленный
+STARTUP_DURATION = Gauge(
+    "app_startup_seconds", "Время запуска воркера", ["phase"], multiprocess_mode="max"
+)
+
+# [число запросов, секунды] для текущего HTTP-запроса; заполняется событиями движка
+_request_sql: ContextVar[list | None] = ContextVar("request_sql", default=None)
+
+
+def record_query(duration: float) -> None:
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += duration
+
+
+def _router_label(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    return route.path.strip("/").split("/", 1)[0] or "root"
+
+
+class MetricsMiddleware:
+    """ASGI middleware: время ответа, статус и SQL на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_sql.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_sql.reset(token)
+            router = _router_label(scope)
+            HTTP_REQUEST_DURATION.labels(router, scope["method"]).observe(elapsed)
+            HTTP_REQUESTS.labels(router, scope["method"], str(status)).inc()
+            DB_QUERIES_PER_REQUEST.labels(router).observe(stats[0])
+            DB_DURATION_PER_REQUEST.labels(router).observe(stats[1])
+
+
+def render() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,7 +1,8 @@
 import enum
 
 from pydantic import EmailStr
-from sqlalchemy import Column, Integer, String, Boolean, func, DateTime, Text, ForeignKey, Date, Enum, Table
+from sqlalchemy import Column, Integer, String, Boolean, func, DateTime, Text, ForeignKey, Date, Enum, Table, Index, UniqueConstraint, FetchedValue, DDL, event
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -35,25 +36,64 @@ class Todo(Base):
     completed = Column(Boolean, default=False)
     user_id = Column(Integer, ForeignKey("users.id"))
     category_id = Column(Integer, ForeignKey("categories.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # в SQLite CURRENT_TIMESTAMP хранится без микросекунд - параметры курсора должны совпадать по формату
+    created_at = Column(
+        DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite"),
+        server_default=func.now(),
+    )
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=FetchedValue())
+    # номер последнего изменения в ленте /sync пользователя
+    sync_seq = Column(Integer, nullable=False, server_default="0")
+    # день выполнения: по нему из гистограммы /stats вычитается снятая отметка
+    completed_on = Column(Date)
 
     owner = relationship("User", back_populates="todos")
     category = relationship("Category", back_populates="todos")
     tags = relationship("Tag", secondary="todo_tags", back_populates="todos")
 
+    # id, created_at и updated_at возвращаются через RETURNING, без повторного SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
+    # ключи keyset-пагинации и фильтров GET /todos
+    __table_args__ = (
+        Index("ix_todos_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_todos_user_id_due_date_id", "user_id", "due_date", "id"),
+        Index("ix_todos_user_id_priority_id", "user_id", "priority", "id"),
+        Index("ix_todos_user_id_category_id", "user_id", "category_id"),
+        Index("ix_todos_user_id_sync_seq", "user_id", "sync_seq"),
+    )
+
+
+# Колонка полнотекстового поиска есть только в PostgreSQL, поэтому в модель не входит.
+# Для существующих баз ее создает миграция, для новых - DDL после create_all.
+TODO_SEARCH_CONFIG = "simple"
+TODO_SEARCH_VECTOR = (
+    f"to_tsvector('{TODO_SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))"
+)
+
+event.listen(Todo.__table__, "after_create", DDL(
+    f"ALTER TABLE todos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({TODO_SEARCH_VECTOR}) STORED"
+).execute_if(dialect="postgresql"))
+event.listen(Todo.__table__, "after_create", DDL(
+    "CREATE INDEX ix_todos_search_vector ON todos USING gin (search_vector)"
+).execute_if(dialect="postgresql"))
+
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, index=True, nullable=False)
+    # sha256 от токена: утечка таблицы не дает готовых токенов
+    token_hash = Column(String, unique=True, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # время выдачи; при ротации обновляется, по нему вытесняются старые сессии
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User")
 
+    __table_args__ = (Index("ix_refresh_tokens_user_id_created_at", "user_id", "created_at"),)
+
 
 class Category(Base):
     __tablename__ = "categories"
@@ -62,9 +102,12 @@ class Category(Base):
     name = Column(String, nullable=False)
     color = Column(String, nullable=False, default="#ffffff")
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sync_seq = Column(Integer, nullable=False, server_default="0")
 
     todos = relationship("Todo", back_populates="category")
 
+    __table_args__ = (Index("ix_categories_user_id_sync_seq", "user_id", "sync_seq"),)
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -72,13 +115,69 @@ class Tag(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sync_seq = Column(Integer, nullable=False, server_default="0")
 
     todos = relationship("Todo", secondary="todo_tags", back_populates="tags")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_tags_user_id_name"),
+        Index("ix_tags_user_id_sync_seq", "user_id", "sync_seq"),
+        # поиск по префиксу GET /tags?prefix=: text_pattern_ops позволяет LIKE 'abc%' идти по индексу
+        Index(
+            "ix_tags_user_id_lower_name", "user_id", func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+    )
+
+
+class CollectionVersion(Base):
+    """Версия списка пользователя (todos, categories, tags) для ETag/Last-Modified"""
+    __tablename__ = "collection_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    collection = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class SyncTombstone(Base):
+    """Удаленная задача или категория для ленты /sync"""
+    __tablename__ = "sync_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    collection = Column(String, nullable=False)
+    object_id = Column(Integer, nullable=False)
+    sync_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+    __table_args__ = (Index("ix_sync_tombstones_user_id_sync_seq", "user_id", "sync_seq"),)
+
+
+class TodoStat(Base):
+    """Число задач и выполненных задач пользователя по приоритету для GET /stats"""
+    __tablename__ = "todo_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    priority = Column(Enum(Priority), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
+
+class TodoDayStat(Base):
+    """По дням: открытые задачи со сроком на этот день и задачи, выполненные в этот день"""
+    __tablename__ = "todo_day_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    due_open = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
 
 todo_tags = Table(
     "todo_tags",
     Base.metadata,
     Column("todo_id", Integer, ForeignKey("todos.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_todo_tags_tag_id", "tag_id"),
 )
@@ -0,0 +1,115 @@
+import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import getenv
+
+logger = logging.getLogger(__name__)
+
+# off - выключено, header - по заголовку X-SQL-Profile, on - для каждого запроса
+SQL_PROFILE = getenv("SQL_PROFILE", "off")
+# одинаковый запрос чаще этого за один HTTP-запрос считается подозрением на N+1
+SQL_PROFILE_REPEAT_THRESHOLD = int(getenv("SQL_PROFILE_REPEAT_THRESHOLD", "5"))
+PROFILE_HEADER = b"x-sql-profile"
+
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|:\w+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query_shape(statement: str) -> str:
+    """Текст запроса без параметров: IN (?, ?, ?) и IN (?) дают одну форму"""
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class SQLProfile:
+    """Все SQL-запросы, выполненные внутри profile_sql()"""
+
+    def __init__(self):
+        self.statements: list[tuple[str, float]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def duration(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+    def shapes(self) -> dict[str, tuple[int, float]]:
+        """Форма запроса -> (сколько раз, суммарное время), по убыванию числа повторов"""
+        grouped: dict[str, list] = {}
+        for statement, duration in self.statements:
+            entry = grouped.setdefault(query_shape(statement), [0, 0.0])
+            entry[0] += 1
+            entry[1] += duration
+        return dict(sorted(((shape, tuple(entry)) for shape, entry in grouped.items()), key=lambda item: -item[1][0]))
+
+    def repeated(self, threshold: int = SQL_PROFILE_REPEAT_THRESHOLD) -> dict[str, tuple[int, float]]:
+        return {shape: stats for shape, stats in self.shapes().items() if stats[0] > threshold}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+_current: ContextVar[SQLProfile | None] = ContextVar("sql_profile", default=None)
+
+
+def record_statement(statement: str, duration: float) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.statements.append((statement, duration))
+
+
+@contextmanager
+def profile_sql():
+    """Собирает запросы блока; в тестах - через фикстуру max_queries (tests/conftest.py)"""
+    profile = SQLProfile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+def _requested(scope) -> bool:
+    if SQL_PROFILE == "on":
+        return True
+    if SQL_PROFILE == "header":
+        return any(name == PROFILE_HEADER and value not in (b"", b"0") for name, value in scope["headers"])
+    return False
+
+
+class SQLProfilingMiddleware:
+    """Профилирование SQL по запросу: заголовок Server-Timing и предупреждения о N+1 в лог"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _current.get() is not None or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        with profile_sql() as profile:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                logger.info(
+                    "%s %s: %d SQL queries, %.1f ms",
+                    scope["method"], scope["path"], profile.count, profile.duration * 1000,
+                )
+                for shape, (count, duration) in profile.repeated().items():
+                    logger.warning(
+                        "%s %s: possible N+1, %d x %.1f ms: %s",
+                        scope["method"], scope["path"], count, duration * 1000, shape,
+                    )
@@ -0,0 +1,13 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON через orjson для готовых словарей, минуя валидацию response_model.
+
+    Даты и время сериализуются так же, как в Pydantic (UTC как Z), поэтому ответ
+    совпадает с тем, что описан в response_model эндпоинта.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
@@ -1,30 +1,54 @@
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.orm import Session
+import zlib
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from datetime import date
 
 from .. import auth, crud, schemas
-from ..database import get_db
+from ..database import SessionLocal
 
 router = APIRouter(prefix="/anki-export", tags=["anki"])
 
-@router.get("/", response_class=Response)
+
+def sanitize(value: str | None) -> str:
+    return (value or "").replace("\t", " ").replace("\r", "").replace("\n", "<br>")
+
+
+async def tsv_lines(user_id: int, filters: schemas.TodoFilters):
+    yield "Front\tBack"
+    # сессия открывается здесь: зависимость get_db закрывается до начала отправки тела
+    async with SessionLocal() as db:
+        async for rows in crud.stream_todo_texts(db, user_id, filters):
+            yield "".join(f"\n{sanitize(title)}\t{sanitize(description)}" for title, description in rows)
+
+
+async def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@router.get("/", response_class=StreamingResponse)
 async def export_anki(
+    filters: schemas.TodoFilters = Depends(),
+    gzip: bool = False,
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
 ):
-    todos = crud.get_todos(db, user_id=current_user.id, skip=0, limit=10000)
-
-    def sanitize(value: str | None) -> str:
-        return (value or "").replace("\t", " ").replace("\r", "").replace("\n", "<br>")
+    filename = f"anki_{date.today().isoformat()}.tsv"
+    content = tsv_lines(current_user.id, filters)
 
-    header = "Front\tBack"
-    rows = [f"{sanitize(t.title)}\t{sanitize(t.description)}" for t in todos]
-    content = "\n".join([header, *rows])
+    if gzip:
+        return StreamingResponse(
+            gzipped(content),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'},
+        )
 
-    return Response(
-        content=content,
+    return StreamingResponse(
+        content,
         media_type="text/tab-separated-values",
-        headers={
-            "Content-Disposition": f'attachment; filename="anki_{date.today().isoformat()}.tsv"'
-        }
-    )
\ No newline at end of file
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,36 +1,50 @@
 from typing import List
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import schemas, auth, crud
+from .. import schemas, auth, crud, etag, cache
 from ..database import get_db
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
-@router.get("/", response_model=List[schemas.Category])
+_categories_json = TypeAdapter(List[schemas.Category])
+
+@router.get("/", response_model=List[schemas.Category],
+            dependencies=[Depends(etag.collection_etag("categories", daily=True))])
 async def read_categories(
+    request: Request,
+    response: Response,
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.get_categories(db, current_user.id)
+    """Список категорий; готовый JSON кэшируется до следующего изменения (см. cache.py)"""
+    cached = await cache.cached_response(request, response.headers)
+    if cached is not None:
+        return cached
+    categories = _categories_json.validate_python(await crud.get_categories(db, current_user.id), from_attributes=True)
+    body = _categories_json.dump_json(categories)
+    return await cache.cache_response(
+        request, Response(body, media_type="application/json", headers=response.headers)
+    )
 
 @router.post("/", response_model=schemas.Category)
 async def create_category(
     category: schemas.CategoryCreate,
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.create_category(db, category.name, category.color, current_user.id)
+    return await crud.create_category(db, category.name, category.color, current_user.id)
 
 @router.put("/{category_id}", response_model=schemas.Category)
 async def update_category(
     category_id: int,
     category: schemas.CategoryUpdate,
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.update_category(db, category_id, current_user.id, category.name, category.color)
+    return await crud.update_category(db, category_id, current_user.id, category.name, category.color)
 
 
 @router.delete("/{category_id}", response_model=schemas.Category)
@@ -38,6 +52,6 @@ async def delete_category(
     category_id: int,
     new_category_id: int | None = None,
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.delete_category(db, category_id, current_user.id, new_category_id)
\ No newline at end of file
+    return await crud.delete_category(db, category_id, current_user.id, new_category_id)
\ No newline at end of file
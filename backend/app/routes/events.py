@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+
+from .. import auth, events
+from ..database import SessionLocal
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# EventSource в браузере не умеет передавать заголовки, поэтому токен можно передать в ?access_token=
+_bearer = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+
+def _token(header_token: str | None = Depends(_bearer), access_token: str | None = None) -> str:
+    token = header_token or access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token
+
+
+@router.get("/", response_class=StreamingResponse)
+async def stream_events(token: str = Depends(_token)):
+    """Поток изменений пользователя (text/event-stream)
+
+    Событие todos.created, todos.updated, todos.deleted, categories.* или tags.created
+    содержит {"collection", "op", "ids", "seq"}; по нему клиент вызывает
+    GET /sync?since=<свой курсор>. overflow - события пропущены, нужен тот же /sync.
+    """
+    # сессия закрывается до начала потока: открытый поток не держит соединение с базой
+    async with SessionLocal() as db:
+        user = await auth.get_current_user(token, db)
+    return StreamingResponse(
+        events.stream(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
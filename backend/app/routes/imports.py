@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import auth, crud, importer, schemas
+from ..database import get_db
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+
+@router.post("/", response_model=schemas.TodoImportResult)
+async def import_todos(
+    request: Request,
+    file_format: schemas.TodoImportFormat | None = Query(None, alias="format"),
+    dry_run: bool = False,
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Импорт задач из тела запроса (файл целиком, не multipart): CSV, TSV или JSON, можно в gzip.
+
+    Формат берется из ?format= или Content-Type. Тело разбирается по мере чтения (см. importer.py),
+    строки с ошибками пропускаются и перечисляются в errors. Задачи записываются одной
+    транзакцией после того, как файл получен целиком. dry_run=true выполняет импорт
+    и откатывает его: отчет тот же, но ничего не сохраняется.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    file_format = file_format or importer.MEDIA_TYPES.get(media_type)
+    if file_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Pass ?format=csv|tsv|json or a text/csv, text/tab-separated-values or application/json body",
+        )
+    # соединение, взятое для проверки токена, не должно ждать, пока клиент передает файл
+    await db.close()
+    summary = schemas.TodoImportResult(dry_run=dry_run)
+    try:
+        staged = await importer.stage(importer.parse(request.stream(), file_format), summary)
+    except importer.ImportFileError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    with staged:
+        return await crud.import_todos(db, importer.staged_rows(staged), current_user.id, summary)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from .. import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Метрики в формате Prometheus"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
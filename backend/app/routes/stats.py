@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas, auth, crud
+from ..database import get_db
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+@router.get("/", response_model=schemas.TodoStats)
+async def read_stats(
+    days: int = Query(30, ge=1, le=365, description="Дней в гистограмме выполненных задач"),
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Сводка для дашборда: просроченные, на сегодня, по приоритетам и выполненные по дням
+
+    Считается по счетчикам, которые crud обновляет при каждой записи, без чтения задач.
+    """
+    return await crud.get_stats(db, current_user.id, days)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas, auth, crud
+from ..database import get_db
+from ..responses import FastJSONResponse
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+@router.get("/", response_model=schemas.SyncResponse)
+async def read_changes(
+    since: str | None = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: schemas.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Изменения с курсора since: новые и измененные строки и id удаленных
+
+    Без since (или при reset=true) возвращается полный снимок. Следующий запрос
+    передает cursor из ответа; has_more=true - есть еще страницы, не больше limit строк каждая.
+    """
+    try:
+        changes = await crud.get_changes(db, current_user.id, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(changes)
@@ -1,24 +1,47 @@
 from typing import List
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import schemas, auth, crud
+from .. import schemas, auth, crud, etag, cache
 from ..database import get_db
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
-@router.get("/", response_model=List[schemas.Tag])
+_tags_json = TypeAdapter(List[schemas.TagUsage])
+
+@router.get("/", response_model=List[schemas.TagUsage],
+            dependencies=[Depends(etag.collection_etag("tags"))])
 async def read_tags(
+    request: Request,
+    response: Response,
+    prefix: str | None = Query(None, max_length=100),
+    limit: int | None = Query(None, ge=1, le=1000),
+    sort: schemas.TagSort = "name",
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.get_tags(db, current_user.id)
+    """Теги с числом задач, для автодополнения - ?prefix=...&limit=...
+
+    sort=popular - сначала самые используемые. Готовый JSON кэшируется
+    до следующего изменения тегов или задач (см. cache.py).
+    """
+    cached = await cache.cached_response(request, response.headers)
+    if cached is not None:
+        return cached
+    tags = _tags_json.validate_python(
+        await crud.get_tags(db, current_user.id, prefix=prefix, limit=limit, sort=sort), from_attributes=True
+    )
+    body = _tags_json.dump_json(tags)
+    return await cache.cache_response(
+        request, Response(body, media_type="application/json", headers=response.headers)
+    )
 
 @router.post("/", response_model=schemas.Tag)
 async def create_tag(
     tag: schemas.TagCreate,
     current_user: schemas.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.create_tag(db, tag.name, current_user.id)
\ No newline at end of file
+    return await crud.create_tag(db, tag.name, current_user.id)
\ No newline at end of file
@@ -1,48 +1,135 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import schemas, auth, crud
+from .. import schemas, auth, crud, etag, cache
 from ..database import get_db
+from ..responses import FastJSONResponse
 
 router = APIRouter(prefix="/todos", tags=["todos"])
 
-@router.get("/", response_model=List[schemas.Todo])
+@router.get("/", response_model=List[schemas.Todo] | List[schemas.TodoSummary],
+            dependencies=[Depends(etag.collection_etag("todos"))])
 async def read_todos(
+        request: Request,
+        response: Response,
         skip: int = 0,
-        limit: int = 100,
+        limit: int = Query(100, ge=1),
+        cursor: str | None = None,
+        sort: schemas.TodoSort = "created_at",
+        order: schemas.SortOrder = "asc",
+        view: schemas.TodoView = "full",
+        fields: str | None = Query(None, description="Поля через запятую, например title,due_date,tags"),
+        filters: schemas.TodoFilters = Depends(),
         current_user: schemas.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    """Получение задачи пользователя"""
-    todos = crud.get_todos(
-        db,
-        user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-    )
+    """Получение задачи пользователя
 
-    return todos
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    view=summary или fields= выбирают из базы только нужные колонки;
+    id и поле сортировки возвращаются всегда.
+    Ответ собирается из строк и сериализуется orjson; схема - response_model.
+    Готовый ответ кэшируется до следующего изменения задач (см. cache.py).
+    """
+    cached = await cache.cached_response(request, response.headers)
+    if cached is not None:
+        return cached
+
+    try:
+        todos = await crud.get_todos(
+            db,
+            user_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            filters=filters,
+            sort=sort,
+            order=order,
+            cursor=cursor,
+            fields=crud.todo_fields(view, fields),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(todos) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_todo_cursor(todos[-1], sort, order)
+
+    return await cache.cache_response(request, FastJSONResponse(todos, headers=response.headers))
+
+@router.get("/search", response_model=List[schemas.Todo] | List[schemas.TodoSummary])
+async def search_todos(
+        response: Response,
+        q: str = Query(..., min_length=1),
+        skip: int = 0,
+        limit: int = Query(100, ge=1),
+        cursor: str | None = None,
+        sort: schemas.TodoSort | None = None,
+        order: schemas.SortOrder = "asc",
+        view: schemas.TodoView = "full",
+        fields: str | None = Query(None, description="Поля через запятую, например title,due_date,tags"),
+        filters: schemas.TodoFilters = Depends(),
+        current_user: schemas.User = Depends(auth.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """Поиск задач по названию и описанию
+
+    Без sort результаты отсортированы по релевантности и листаются через skip/limit;
+    с sort работает та же курсорная пагинация, что и у списка задач.
+    """
+    try:
+        todos = await crud.search_todos(
+            db,
+            user_id=current_user.id,
+            text=q,
+            skip=skip,
+            limit=limit,
+            filters=filters,
+            sort=sort,
+            order=order,
+            cursor=cursor,
+            fields=crud.todo_fields(view, fields),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if sort is not None and len(todos) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_todo_cursor(todos[-1], sort, order)
+
+    return FastJSONResponse(todos, headers=response.headers)
 
 @router.post("/", response_model=schemas.Todo)
 async def create_todo(
         todo: schemas.TodoCreate,
         user: schemas.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """Создание задачи"""
-    return crud.create_todo(db=db, todo=todo, user_id=user.id)
+    return await crud.create_todo(db=db, todo=todo, user_id=user.id)
+
+@router.post("/batch", response_model=schemas.TodoBatchResponse)
+async def batch_todos(
+        batch: schemas.TodoBatchRequest,
+        current_user: schemas.User = Depends(auth.get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """Пакетное создание, изменение, завершение и удаление задач в одной транзакции
+
+    Не больше TODO_BATCH_MAX_SIZE (500) операций за запрос. Результат возвращается
+    для каждой операции в порядке запроса: ok, not_found или error.
+    """
+    results = await crud.batch_todos(db, batch.operations, current_user.id)
+    return {"results": results}
 
 @router.put("/{todo_id}", response_model=schemas.Todo)
 async def update_todo(
         todo_id: int,
         todo_update: schemas.TodoUpdate,
         current_user: schemas.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """Обновление задачи"""
-    db_todo = crud.update_todo(db, todo_id, todo_update, current_user.id)
+    db_todo = await crud.update_todo(db, todo_id, todo_update, current_user.id)
 
     if db_todo is None:
         raise HTTPException(status_code=404, detail="Todo not found")
@@ -53,9 +140,9 @@ async def update_todo(
 async def delete_todo(
         todo_id: int,
         user_id: schemas.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    todo_delete = crud.delete_todo(db, todo_id, user_id.id)
+    todo_delete = await crud.delete_todo(db, todo_id, user_id.id)
 
     if todo_delete is None:
         raise HTTPException(status_code=404, detail="Todo not found")
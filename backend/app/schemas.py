@@ -1,7 +1,7 @@
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Annotated, Dict, Literal, Optional, List, Union
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from .models import Priority
 
 
@@ -27,6 +27,85 @@ class TodoUpdate(TodoBase):
     tags: Optional[List[str]] = None
 
 
+# Пакетные операции над задачами
+TODO_BATCH_MAX_SIZE = 500
+
+class TodoBatchCreate(BaseModel):
+    op: Literal["create"]
+    data: TodoCreate
+
+class TodoBatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: int
+    data: TodoUpdate
+
+class TodoBatchComplete(BaseModel):
+    op: Literal["complete"]
+    id: int
+    completed: bool = True
+
+class TodoBatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+TodoBatchOperation = Annotated[
+    Union[TodoBatchCreate, TodoBatchUpdate, TodoBatchComplete, TodoBatchDelete],
+    Field(discriminator="op"),
+]
+
+class TodoBatchRequest(BaseModel):
+    operations: List[TodoBatchOperation] = Field(min_length=1, max_length=TODO_BATCH_MAX_SIZE)
+
+class TodoBatchItemResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None
+    status: Literal["ok", "not_found", "error"]
+    detail: Optional[str] = None
+
+class TodoBatchResponse(BaseModel):
+    results: List[TodoBatchItemResult]
+
+
+# Импорт задач из файла (POST /import)
+TodoImportFormat = Literal["csv", "tsv", "json"]
+
+class TodoImportRow(TodoBase):
+    """Строка файла: категория и теги задаются именами и создаются, если их нет"""
+    title: str = Field(min_length=1)
+    completed: bool = False
+    category: Optional[str] = None
+    tags: List[str] = []
+
+class TodoImportError(BaseModel):
+    row: int  # строка файла CSV/TSV или номер элемента JSON, с 1
+    detail: str
+
+class TodoImportResult(BaseModel):
+    dry_run: bool
+    total: int = 0
+    imported: int = 0
+    failed: int = 0
+    categories_created: int = 0
+    tags_created: int = 0
+    errors: List[TodoImportError] = []  # первые importer.IMPORT_MAX_ERRORS ошибок
+
+
+class TodoFilters(BaseModel):
+    completed: Optional[bool] = None
+    priority: Optional[Priority] = None
+    category_id: Optional[int] = None
+    tag: Optional[str] = None
+    due_from: Optional[date] = None
+    due_to: Optional[date] = None
+
+
+TodoSort = Literal["created_at", "due_date", "priority"]
+SortOrder = Literal["asc", "desc"]
+TodoView = Literal["full", "summary"]
+TagSort = Literal["name", "popular"]
+
+
 class CategoryCreate(BaseModel):
     name: str
     color: str = "#ffffff"
@@ -41,6 +120,9 @@ class Category(BaseModel):
     name: str
     color: str
     todo_count: int = 0
+    completed_count: int = 0
+    open_count: int = 0
+    overdue_count: int = 0
 
     class Config:
         from_attributes = True
@@ -57,6 +139,10 @@ class Tag(BaseModel):
     class Config:
         from_attributes = True
 
+
+class TagUsage(Tag):
+    todo_count: int = 0
+
 class Todo(TodoBase):
     id: int
     completed: bool
@@ -70,6 +156,39 @@ class Todo(TodoBase):
         from_attributes = True
 
 
+class TodoSummary(BaseModel):
+    """Задача в списке при view=summary: без описания, user_id и updated_at"""
+    title: str
+    priority: Priority
+    due_date: Optional[date] = None
+    id: int
+    completed: bool
+    created_at: datetime
+    category: Optional[Category] = None
+    tags: List[Tag] = []
+
+
+# Лента изменений /sync
+class SyncCategory(BaseModel):
+    id: int
+    name: str
+    color: str
+
+class SyncDeleted(BaseModel):
+    todos: List[int] = []
+    categories: List[int] = []
+
+class SyncResponse(BaseModel):
+    cursor: str  # непрозрачный; передается в since следующего запроса
+    has_more: bool
+    # клиент должен заменить локальную копию целиком (первая синхронизация или устаревший курсор)
+    reset: bool
+    todos: List[Todo]
+    categories: List[SyncCategory]
+    tags: List[Tag]
+    deleted: SyncDeleted
+
+
 # Схемы для пользователей
 class UserBase(BaseModel):
     email: EmailStr
@@ -81,7 +200,40 @@ class User(UserBase):
     id: int
     is_active: bool
     created_at: datetime
-    todos: List[Todo] = []
+
+    class Config:
+        from_attributes = True
+
+class UserStats(BaseModel):
+    todo_count: int
+    completed_count: int
+    open_count: int
+    overdue_count: int
+    due_today_count: int
+    category_count: int
+    tag_count: int
+
+class PriorityStats(BaseModel):
+    total: int
+    completed: int
+    open: int
+
+class DayCompletions(BaseModel):
+    day: date
+    completed: int
+
+class TodoStats(BaseModel):
+    total: int
+    completed: int
+    open: int
+    overdue: int
+    due_today: int
+    by_priority: Dict[Priority, PriorityStats]
+    # выполненные задачи по дням за последние days дней, от старых к новым
+    completed_per_day: List[DayCompletions]
+
+class UserProfile(User):
+    stats: Optional[UserStats] = None
 
 # Схемы для аутентификации
 class Token(BaseModel):
@@ -96,3 +248,12 @@ class RefreshTokenRequest(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
+
+class CurrentUser(BaseModel):
+    """Данные пользователя, достаточные для авторизации запроса; хранятся в кеше"""
+    id: int
+    email: EmailStr
+    is_active: bool
+
+    model_config = ConfigDict(frozen=True, from_attributes=True)
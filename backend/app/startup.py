@@ -0,0 +1,122 @@
+"""Подготовка схемы базы при запуске и отчет о времени старта.
+
+DB_SCHEMA_STARTUP задает, что воркер делает со схемой в lifespan:
+    check      - сверяет ревизию в alembic_version с head миграций и не стартует при расхождении
+    create_all - создает недостающие таблицы по моделям (локальная разработка, SQLite)
+    skip       - не обращается к базе до первого запроса
+    auto       - check для PostgreSQL, create_all для остальных баз; PostgreSQL без alembic_version
+                 (например, созданный database/init.sql) тоже получает create_all с предупреждением
+Под gunicorn проверку один раз выполняет мастер до запуска воркеров (см. gunicorn.conf.py),
+воркерам остается skip.
+"""
+import asyncio
+import logging
+import os
+from os import getenv
+from pathlib import Path
+
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from . import metrics, models
+from .database import ASYNC_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# бюджет на импорт и lifespan воркера; при превышении в лог пишется предупреждение, 0 - без ограничения
+STARTUP_BUDGET_SECONDS = float(getenv("STARTUP_BUDGET_SECONDS", "0"))
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "alembic"
+
+
+class SchemaMismatchError(RuntimeError):
+    """Ревизия базы не совпадает с последней миграцией"""
+
+
+def schema_mode(url: str = ASYNC_DATABASE_URL) -> str:
+    # читается при каждом вызове: мастер gunicorn импортирует модуль до того, как выставит skip
+    mode = getenv("DB_SCHEMA_STARTUP", "auto")
+    if mode == "auto":
+        return "check" if make_url(url).get_backend_name() == "postgresql" else "create_all"
+    if mode not in ("check", "create_all", "skip"):
+        raise ValueError(f"Unknown DB_SCHEMA_STARTUP: {mode}")
+    return mode
+
+
+def migration_heads() -> set[str]:
+    # alembic нужен только для проверки и добавляет к импорту ~150 мс
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory(str(MIGRATIONS_DIR)).get_heads())
+
+
+async def database_revisions(conn) -> set[str]:
+    """Ревизия базы: один запрос к alembic_version, без рефлексии таблиц"""
+    try:
+        result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        return set(result.scalars())
+    except exc.DBAPIError:
+        # таблицы нет: миграции к базе не применялись
+        return set()
+
+
+def verify_revisions(current: set[str]) -> None:
+    heads = migration_heads()
+    if current != heads:
+        raise SchemaMismatchError(
+            f"Database revision {', '.join(sorted(current)) or 'none'} does not match "
+            f"migrations head {', '.join(sorted(heads))}: run `alembic upgrade head`"
+        )
+
+
+async def prepare_schema(engine, mode: str | None = None) -> None:
+    mode = mode or schema_mode()
+    if mode == "check":
+        async with engine.connect() as conn:
+            current = await database_revisions(conn)
+        if current or getenv("DB_SCHEMA_STARTUP", "auto") != "auto":
+            verify_revisions(current)
+            return
+        # база без ревизии при auto: прежнее поведение, чтобы не ломать docker compose с init.sql
+        logger.warning("database has no alembic revision, creating missing tables instead of the revision check")
+        mode = "create_all"
+    if mode == "create_all":
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+
+
+def check_schema_once() -> None:
+    """Проверка в мастере gunicorn до запуска воркеров; воркеры после нее схему не трогают.
+
+    Соединение открывается отдельным движком без пула, чтобы воркеры
+    не унаследовали после fork соединений мастера.
+    """
+    if schema_mode() != "check":
+        return
+
+    async def run():
+        engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            await prepare_schema(engine, "check")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+    os.environ["DB_SCHEMA_STARTUP"] = "skip"
+
+
+def report_startup(import_seconds: float, lifespan_seconds: float) -> None:
+    metrics.STARTUP_DURATION.labels("import").set(import_seconds)
+    metrics.STARTUP_DURATION.labels("lifespan").set(lifespan_seconds)
+    total = import_seconds + lifespan_seconds
+    logger.info(
+        "worker %d started in %.0f ms (import %.0f ms, lifespan %.0f ms, schema %s)",
+        os.getpid(), total * 1000, import_seconds * 1000, lifespan_seconds * 1000, schema_mode(),
+    )
+    if STARTUP_BUDGET_SECONDS and total > STARTUP_BUDGET_SECONDS:
+        logger.warning(
+            "worker %d startup took %.0f ms, over the %.0f ms budget",
+            os.getpid(), total * 1000, STARTUP_BUDGET_SECONDS * 1000,
+        )
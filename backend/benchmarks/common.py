@@ -0,0 +1,55 @@
+"""Shared setup for the in-process benchmarks.
+
+Importing this module points the app at ASYNC_DATABASE_URL, or at a throwaway
+SQLite file when it is not set, and makes the app package importable.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AUTH_SECRET_KEY", "benchmark")
+os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import insert
+
+from app import auth, models
+from app.database import SessionLocal
+
+WORDS = (
+    "milk bread report meeting invoice review deploy design call email plan budget "
+    "doctor gym book flight hotel taxes garden paint fix update write read study"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def seed_user(rows: int, batch: int = 10000, seed: int = 0, description_words: int = 12) -> models.User:
+    """Создает пользователя с rows задачами, вставляя их пачками"""
+    rng = random.Random(seed)
+    async with SessionLocal() as db:
+        user = models.User(email=f"bench_{time.time_ns()}@example.com", hashed_password="-")
+        db.add(user)
+        await db.commit()
+        for start in range(0, rows, batch):
+            await db.execute(insert(models.Todo), [
+                {
+                    "title": sentence(rng, 3),
+                    "description": sentence(rng, description_words),
+                    "priority": rng.choice(list(models.Priority)),
+                    "completed": rng.random() < 0.3,
+                    "user_id": user.id,
+                }
+                for _ in range(start, min(start + batch, rows))
+            ])
+        await db.commit()
+        return user
+
+
+def auth_headers(user: models.User) -> dict:
+    token = auth.create_access_token({"sub": user.email, "uid": user.id})
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,102 @@
+"""Idle GET /events streams per worker and fan-out latency of one write.
+
+Runs against a live server (streaming through ASGITransport is buffered),
+e.g. one uvicorn worker started with `uvicorn app.main:app --port 8000`.
+Opens --connections SSE streams for one user over raw sockets, then creates
+--events todos and measures how long every stream takes to see each event:
+
+    python benchmarks/event_fanout.py --connections 20000 --pid <worker pid>
+
+Raise `ulimit -n` on both sides first. With --pid the worker's RSS is
+printed before and after the streams are opened.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import httpx
+
+
+def rss_mib(pid: int | None) -> float | None:
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+async def open_stream(host: str, port: int, token: str):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"GET /events/ HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n"
+        f"Accept: text/event-stream\r\n\r\n".encode()
+    )
+    status = await reader.readline()
+    if b" 200 " not in status:
+        raise RuntimeError(status.decode().strip())
+    while await reader.readline() not in (b"\r\n", b""):
+        pass
+    return reader, writer
+
+
+async def wait_for_event(reader: asyncio.StreamReader, marker: bytes, started: list[float]) -> float:
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise RuntimeError("stream closed")
+        if marker in line:
+            return time.perf_counter() - started[0]
+
+
+async def run(url: str, connections: int, events: int, pid: int | None) -> None:
+    parts = urlsplit(url)
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        email = f"events_{uuid.uuid4().hex[:8]}@example.com"
+        await client.post("/auth/register", json={"email": email, "password": "benchmark"})
+        r = await client.post("/auth/login", data={"username": email, "password": "benchmark"})
+        r.raise_for_status()
+        token = r.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        before = rss_mib(pid)
+        started = time.perf_counter()
+        streams = []
+        for start in range(0, connections, 500):
+            streams += await asyncio.gather(*(
+                open_stream(parts.hostname, parts.port or 80, token)
+                for _ in range(min(500, connections - start))
+            ))
+        print(f"opened {len(streams)} streams in {time.perf_counter() - started:.1f} s")
+        after = rss_mib(pid)
+        if before is not None and after is not None:
+            print(f"worker RSS {before:.0f} -> {after:.0f} MiB ({(after - before) * 1024 / connections:.1f} KiB per stream)")
+
+        for _ in range(events):
+            clock = [0.0]
+            waiters = [asyncio.create_task(wait_for_event(reader, b"todos.created", clock)) for reader, _ in streams]
+            await asyncio.sleep(0)
+            clock[0] = time.perf_counter()
+            (await client.post("/todos/", json={"title": "fan-out"}, headers=headers)).raise_for_status()
+            latencies = sorted(await asyncio.gather(*waiters))
+            print(
+                f"event delivered to {len(latencies)} streams: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+            )
+
+        for _, writer in streams:
+            writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=3)
+    parser.add_argument("--pid", type=int, help="PID of the server worker, to report its RSS")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.connections, args.events, args.pid))
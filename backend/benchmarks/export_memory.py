@@ -0,0 +1,77 @@
+"""Peak Python memory of the Anki/TSV export for a large account.
+
+Seeds one user with --rows todos using bulk inserts, then streams
+GET /anki-export/ straight through the ASGI app (the body is counted and
+discarded, not buffered) while tracemalloc records the peak allocation:
+
+    python benchmarks/export_memory.py --rows 1000000
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... python benchmarks/export_memory.py
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from common import auth_headers, seed_user
+
+from app import models
+from app.main import app
+
+
+async def export(user: models.User, query_string: bytes) -> tuple[int, int]:
+    authorization = auth_headers(user)["Authorization"]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/anki-export/", "raw_path": b"/anki-export/",
+        "query_string": query_string, "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"host", b"bench"), (b"authorization", authorization.encode())],
+    }
+    status = 0
+    size = 0
+    request_sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    return status, size
+
+
+async def run(rows: int, gzip: bool) -> None:
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        user = await seed_user(rows)
+        print(f"seeded {rows} todos in {time.perf_counter() - started:.1f} s")
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        status, size = await export(user, b"gzip=true" if gzip else b"")
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"status {status}, {size / 2**20:.1f} MiB sent in {elapsed:.1f} s")
+    print(f"peak traced memory during export: {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.gzip))
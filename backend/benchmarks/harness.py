@@ -0,0 +1,334 @@
+"""Benchmark suite for every API route, with machine-readable results.
+
+Seeds users through seed.py, then drives the app in-process with an async
+httpx client. Each scenario sends --requests requests from --concurrency
+workers. It reports latency p50/p95/p99, throughput and SQL statements
+per request, and writes everything as JSON:
+
+    python benchmarks/harness.py --users 20 --todos 500 --output before.json
+    python benchmarks/harness.py --users 20 --todos 500 --compare before.json --max-regression 15
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... python benchmarks/harness.py --scenarios todos.
+
+--compare prints the change against an earlier result file. With
+--max-regression, the exit status is 1 if any scenario's p95 or mean
+statement count grew by more than that many percent. Runs are only
+comparable with the same seed options and database.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import seed as seeding
+from common import WORDS
+
+import httpx
+from sqlalchemy import event, select
+
+from app import auth, cache, models
+from app.database import SessionLocal, engine
+from app.main import app
+
+_statements: ContextVar[list | None] = ContextVar("bench_statements", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    counter = _statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@dataclass
+class Account:
+    user: seeding.SeededUser
+    headers: dict
+    todo_ids: list[int]
+    created_todos: list[int] = field(default_factory=list)
+    created_categories: list[int] = field(default_factory=list)
+    refresh_token: str | None = None
+
+
+@dataclass
+class Worker:
+    account: Account
+    rng: random.Random
+    counter: itertools.count
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Ближайший ранг по отсортированному списку"""
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+# Сценарий: (метод, путь, kwargs для httpx) по состоянию воркера. Запросы
+# на удаление берут объекты, созданные сценариями create, поэтому порядок важен.
+def _login(w: Worker):
+    return "POST", "/auth/login", {"data": {"username": w.account.user.email, "password": seeding.PASSWORD}}
+
+
+def _register(w: Worker):
+    email = f"bench_{time.time_ns()}_{next(w.counter)}@example.com"
+    return "POST", "/auth/register", {"json": {"email": email, "password": seeding.PASSWORD}}
+
+
+def _refresh(w: Worker):
+    return "POST", "/auth/refresh", {"json": {"refresh_token": w.account.refresh_token}}
+
+
+def _todo_payload(w: Worker) -> dict:
+    return {
+        "title": " ".join(w.rng.sample(WORDS, 3)),
+        "priority": w.rng.choice(["P1", "P2", "P3"]),
+        "category_id": w.rng.choice(w.account.user.category_ids) if w.account.user.category_ids else None,
+        "tags": w.rng.sample(w.account.user.tag_names, min(2, len(w.account.user.tag_names))),
+    }
+
+
+def _update_todo(w: Worker):
+    todo_id = w.rng.choice(w.account.todo_ids)
+    return "PUT", f"/todos/{todo_id}", {"json": {"completed": w.rng.random() < 0.5, "tags": _todo_payload(w)["tags"]}}
+
+
+def _batch(w: Worker):
+    ids = w.rng.sample(w.account.todo_ids, min(20, len(w.account.todo_ids)))
+    return "POST", "/todos/batch", {
+        "json": {"operations": [{"op": "complete", "id": todo_id, "completed": True} for todo_id in ids]}
+    }
+
+
+def _delete_todo(w: Worker):
+    return "DELETE", f"/todos/{w.account.created_todos.pop()}", {}
+
+
+def _create_category(w: Worker):
+    return "POST", "/categories/", {"json": {"name": f"bench {time.time_ns()} {next(w.counter)}", "color": "#3b82f6"}}
+
+
+def _update_category(w: Worker):
+    category_id = w.rng.choice(w.account.user.category_ids)
+    return "PUT", f"/categories/{category_id}", {"json": {"color": w.rng.choice(seeding.COLORS)}}
+
+
+def _delete_category(w: Worker):
+    return "DELETE", f"/categories/{w.account.created_categories.pop()}", {}
+
+
+SCENARIOS = {
+    "auth.register": _register,
+    "auth.login": _login,
+    "auth.refresh": _refresh,
+    "auth.me": lambda w: ("GET", "/auth/me", {}),
+    "auth.me_stats": lambda w: ("GET", "/auth/me", {"params": {"include": "stats"}}),
+    "todos.list": lambda w: ("GET", "/todos/", {"params": {"limit": 50}}),
+    "todos.list_filtered": lambda w: (
+        "GET", "/todos/", {"params": {"limit": 50, "completed": "false", "sort": "due_date"}}
+    ),
+    "todos.list_summary": lambda w: ("GET", "/todos/", {"params": {"limit": 50, "view": "summary"}}),
+    "todos.search": lambda w: ("GET", "/todos/search", {"params": {"q": w.rng.choice(WORDS), "limit": 20}}),
+    "todos.create": lambda w: ("POST", "/todos/", {"json": _todo_payload(w)}),
+    "todos.update": _update_todo,
+    "todos.batch": _batch,
+    "todos.delete": _delete_todo,
+    "categories.list": lambda w: ("GET", "/categories/", {}),
+    "categories.create": _create_category,
+    "categories.update": _update_category,
+    "categories.delete": _delete_category,
+    "tags.list": lambda w: ("GET", "/tags/", {}),
+    "tags.autocomplete": lambda w: ("GET", "/tags/", {"params": {"prefix": "tag1", "limit": 10, "sort": "popular"}}),
+    "tags.create": lambda w: ("POST", "/tags/", {"json": {"name": f"bench{next(w.counter)}"}}),
+    "stats": lambda w: ("GET", "/stats/", {"params": {"days": 30}}),
+    "sync.full": lambda w: ("GET", "/sync/", {"params": {"limit": 1000}}),
+    "export.tsv": lambda w: ("GET", "/anki-export/", {}),
+    "metrics": lambda w: ("GET", "/metrics", {}),
+}
+# bcrypt: запросы с хешированием пароля в --slow-factor раз реже остальных
+SLOW_SCENARIOS = {"auth.register", "auth.login"}
+
+
+async def prepare_accounts(users: list[seeding.SeededUser]) -> list[Account]:
+    accounts = []
+    async with SessionLocal() as db:
+        for user in users:
+            result = await db.execute(
+                select(models.Todo.id).filter(models.Todo.user_id == user.id).order_by(models.Todo.id).limit(1000)
+            )
+            token = auth.create_access_token({"sub": user.email, "uid": user.id})
+            account = Account(user, {"Authorization": f"Bearer {token}"}, list(result.scalars()))
+            account.refresh_token = await auth.create_refresh_token(db, user.id)
+            accounts.append(account)
+    # сценарии update/batch выбирают из существующих задач
+    return [account for account in accounts if account.todo_ids and account.user.category_ids]
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, accounts: list[Account], requests: int, concurrency: int,
+                       seed: int) -> dict:
+    build = SCENARIOS[name]
+    counter = itertools.count()
+    remaining = iter(range(requests))
+    latencies: list[float] = []
+    statements: list[int] = []
+    statuses: dict[str, int] = {}
+
+    async def worker(index: int):
+        # у каждого воркера свой пользователь, пока пользователей хватает: refresh не конфликтует
+        w = Worker(accounts[index % len(accounts)], random.Random(seed * 1000 + index), counter)
+        for _ in remaining:
+            method, url, kwargs = build(w)
+            stats = [0]
+            token = _statements.set(stats)
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, url, headers=w.account.headers, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - started)
+                _statements.reset(token)
+            statements.append(stats[0])
+            statuses[str(r.status_code)] = statuses.get(str(r.status_code), 0) + 1
+            if r.status_code < 400:
+                body = r.json() if r.headers.get("content-type") == "application/json" else None
+                if name == "todos.create":
+                    w.account.created_todos.append(body["id"])
+                elif name == "categories.create":
+                    w.account.created_categories.append(body["id"])
+                elif name == "auth.refresh":
+                    w.account.refresh_token = body["refresh_token"]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if int(status) >= 400),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "statements": {"mean": round(sum(statements) / len(statements), 2), "max": max(statements)},
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, max_regression: float | None) -> bool:
+    """Печатает изменения относительно baseline; False - есть регрессия больше max_regression"""
+    ok = True
+    print(f"\n{'scenario':<22} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16} {'statements':>14}")
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            print(f"{name:<22} (new)")
+            continue
+        cells = []
+        for q in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][q], current["latency_ms"][q]
+            cells.append(f"{new:8.2f} {(new - old) / old * 100 if old else 0:+6.1f}%")
+        old_statements, new_statements = before["statements"]["mean"], current["statements"]["mean"]
+        cells.append(f"{new_statements:6.1f} ({new_statements - old_statements:+.1f})")
+        print(f"{name:<22} " + " ".join(f"{cell:>16}" for cell in cells))
+        if max_regression is not None:
+            p95_old = before["latency_ms"]["p95"]
+            if p95_old and (current["latency_ms"]["p95"] - p95_old) / p95_old * 100 > max_regression:
+                print(f"  regression: {name} p95 grew more than {max_regression}%")
+                ok = False
+            if old_statements and (new_statements - old_statements) / old_statements * 100 > max_regression:
+                print(f"  regression: {name} statements grew more than {max_regression}%")
+                ok = False
+    return ok
+
+
+async def run(args: argparse.Namespace) -> dict:
+    names = [name for name in SCENARIOS if any(name.startswith(prefix) for prefix in args.scenarios)]
+    if args.no_cache:
+        cache.backend = None
+
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        config = seeding.config_from_args(args)
+        accounts = await prepare_accounts(await seeding.seed(config))
+        seeded_in = time.perf_counter() - started
+        print(f"seeded {config.users} users in {seeded_in:.1f} s; {len(accounts)} usable accounts", file=sys.stderr)
+        if not accounts:
+            raise SystemExit("no seeded user has both todos and categories; raise --todos/--categories")
+
+        scenarios = {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+            for name in names:
+                requests = args.requests // args.slow_factor if name in SLOW_SCENARIOS else args.requests
+                # удалить можно только то, что создано раньше в этом прогоне
+                if name in ("todos.delete", "categories.delete"):
+                    attribute = "created_todos" if name == "todos.delete" else "created_categories"
+                    requests = min(requests, min(len(getattr(a, attribute)) for a in accounts[:args.concurrency]))
+                if requests <= 0:
+                    continue
+                scenarios[name] = await run_scenario(client, name, accounts, requests, args.concurrency, args.seed)
+                result = scenarios[name]
+                print(
+                    f"{name:<22} {result['requests']:>6} req {result['throughput_rps']:>9.1f} req/s  "
+                    f"p50 {result['latency_ms']['p50']:8.2f}  p95 {result['latency_ms']['p95']:8.2f}  "
+                    f"p99 {result['latency_ms']['p99']:8.2f} ms  {result['statements']['mean']:5.1f} stmt"
+                    + (f"  {result['errors']} errors" if result["errors"] else ""),
+                    file=sys.stderr,
+                )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "response_cache": None if cache.backend is None else type(cache.backend).__name__,
+            "seconds_seeding": round(seeded_in, 1),
+            "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    seeding.add_arguments(parser)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--slow-factor", type=int, default=10, help="fewer requests for bcrypt-bound scenarios")
+    parser.add_argument("--scenarios", nargs="*", default=[""], help="scenario name prefixes, e.g. todos. auth.login")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--output", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, help="fail if p95 or statements grow by more percent")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
@@ -0,0 +1,107 @@
+"""POST /import throughput and memory: --rows generated todos streamed as CSV, TSV or JSON.
+
+The file is generated on the fly and sent in 64 KiB chunks. The server keeps
+validated rows in a temporary file (in memory up to IMPORT_SPOOL_MAX_MEMORY,
+then on disk) and writes them once the upload ends, so peak RSS growth of the
+process shows whether the import itself stays flat as --rows grows:
+
+    python benchmarks/import_throughput.py --rows 100000 --format csv
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... python benchmarks/import_throughput.py --rows 100000
+
+On SQLite the todo INSERT runs row by row (the dialect cannot match RETURNING
+rows to parameters in a batch), so use PostgreSQL for representative numbers.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+
+from common import WORDS, auth_headers, seed_user, sentence
+
+import httpx
+from sqlalchemy import event
+
+from app.database import engine
+from app.main import app
+
+CHUNK_SIZE = 2**16
+MEDIA_TYPES = {"csv": "text/csv", "tsv": "text/tab-separated-values", "json": "application/json"}
+
+
+def records(rows: int, seed: int):
+    rng = random.Random(seed)
+    for i in range(rows):
+        yield {
+            "title": f"{sentence(rng, 3)} {i}",
+            "description": sentence(rng, 12),
+            "priority": rng.choice(["P1", "P2", "P3"]),
+            "due_date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.5 else "",
+            "completed": "true" if rng.random() < 0.3 else "false",
+            "category": f"Category {rng.randint(0, 9)}",
+            "tags": ",".join(rng.sample(WORDS, rng.randint(0, 3))),
+        }
+
+
+def lines(file_format: str, rows: int, seed: int):
+    columns = ["title", "description", "priority", "due_date", "completed", "category", "tags"]
+    if file_format == "json":
+        yield "["
+        for i, record in enumerate(records(rows, seed)):
+            yield ("," if i else "") + json.dumps(record)
+        yield "]"
+        return
+    separator = "," if file_format == "csv" else "\t"
+    yield separator.join(columns) + "\n"
+    for record in records(rows, seed):
+        if file_format == "csv":
+            yield ",".join(f'"{record[column]}"' for column in columns) + "\n"
+        else:
+            yield "\t".join(record[column] for column in columns) + "\n"
+
+
+async def body(file_format: str, rows: int, seed: int):
+    pending, size = [], 0
+    for line in lines(file_format, rows, seed):
+        pending.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(pending).encode()
+            pending, size = [], 0
+    yield "".join(pending).encode()
+
+
+async def run(rows: int, file_format: str, dry_run: bool, seed: int) -> None:
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    async with app.router.lifespan_context(app):
+        headers = {**auth_headers(await seed_user(0)), "Content-Type": MEDIA_TYPES[file_format]}
+        event.listen(engine.sync_engine, "before_cursor_execute", count)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            r = await client.post("/import/", params={"dry_run": dry_run}, content=body(file_format, rows, seed), headers=headers)
+        elapsed = time.perf_counter() - started
+        r.raise_for_status()
+        result = r.json()
+        rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+        print(
+            f"{file_format}: {result['imported']} of {result['total']} rows in {elapsed:.1f} s "
+            f"({result['imported'] / elapsed:.0f} rows/s), {statements} statements, "
+            f"peak RSS +{rss_growth:.1f} MiB{' (dry run)' if dry_run else ''}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--format", choices=list(MEDIA_TYPES), default="csv")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.format, args.dry_run, args.seed))
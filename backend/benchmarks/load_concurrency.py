@@ -0,0 +1,82 @@
+"""Concurrent throughput benchmark for a running API instance.
+
+Talks to the server over HTTP only, so the same script can be pointed at any
+revision of the backend to compare numbers before and after a change:
+
+    gunicorn app.main:app -k uvicorn.workers.UvicornWorker -w 1 --bind 0.0.0.0:8000
+    python benchmarks/load_concurrency.py --url http://localhost:8000 --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import secrets
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+
+async def prepare_user(client: httpx.AsyncClient, todos: int) -> dict:
+    email = f"bench_{secrets.token_hex(4)}@example.com"
+    password = secrets.token_urlsafe(12)
+    r = await client.post("/auth/register", json={"email": email, "password": password})
+    r.raise_for_status()
+    r = await client.post("/auth/login", data={"username": email, "password": password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    for i in range(todos):
+        r = await client.post("/todos/", json={"title": f"todo {i}", "tags": [f"tag{i % 5}"]}, headers=headers)
+        r.raise_for_status()
+    return headers
+
+
+async def run(url: str, path: str, concurrency: int, total: int, todos: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        headers = await prepare_user(client, todos)
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+        latencies: list[float] = []
+        errors: Counter[str] = Counter()
+
+        async def worker():
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    r = await client.get(path, headers=headers)
+                except httpx.TransportError as e:
+                    # обрыв соединения (например, воркер убит по таймауту) - тоже ошибка, а не конец прогона
+                    errors[type(e).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if r.status_code != 200:
+                    errors[str(r.status_code)] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"GET {path}: {total} requests, concurrency {concurrency}, {sum(errors.values())} errors {dict(errors)}")
+    if not latencies:
+        return
+    print(f"throughput: {total / elapsed:.1f} req/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, "
+          f"p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/todos/")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--todos", type=int, default=100, help="todos to seed for the benchmark user")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.path, args.concurrency, args.requests, args.todos))
@@ -0,0 +1,61 @@
+"""GET /todos?view=summary vs view=full: data fetched from the database and response size.
+
+Seeds one user with --rows todos whose descriptions are --description-words
+long, then for each view reports for one page of --limit todos:
+
+    db payload  - bytes of column values in the main row query (text form,
+                  close to what Postgres sends over the wire)
+    response    - bytes of the JSON body
+    latency     - median time of the request through the app
+
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... python benchmarks/projection.py --limit 1000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from common import auth_headers, seed_user
+
+import httpx
+
+from app import crud
+from app.database import SessionLocal
+from app.main import app
+
+
+async def db_payload(user_id: int, fields: tuple[str, ...], limit: int) -> int:
+    fields = crud._with_keys(fields, "created_at")
+    query = crud._paginate_todos(crud._todo_rows_query(user_id, fields), 0, limit, "created_at", "asc", None)
+    async with SessionLocal() as db:
+        rows = (await db.execute(query)).all()
+    return sum(len(str(value).encode()) for row in rows for value in row if value is not None)
+
+
+async def run(rows: int, limit: int, description_words: int, repeat: int) -> None:
+    async with app.router.lifespan_context(app):
+        user = await seed_user(rows, description_words=description_words)
+        headers = auth_headers(user)
+        print(f"seeded {rows} todos, {description_words}-word descriptions, page of {limit}")
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for view in ("full", "summary"):
+                payload = await db_payload(user.id, crud.TODO_VIEWS[view], limit)
+                latencies = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    r = await client.get("/todos/", params={"view": view, "limit": limit}, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    r.raise_for_status()
+                print(f"{view:>7}: db payload {payload / 1024:8.1f} KiB, response {len(r.content) / 1024:8.1f} KiB, "
+                      f"latency {statistics.median(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--description-words", type=int, default=80)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.limit, args.description_words, args.repeat))
@@ -0,0 +1,55 @@
+"""Latency of the cached GET list endpoints, with and without the response cache.
+
+Seeds one user with --rows todos, then requests each list --requests times
+in-process: first with the cache disabled, then with the backend chosen by
+RESPONSE_CACHE (memory by default; redis needs REDIS_URL):
+
+    python benchmarks/response_cache.py --rows 10000 --limit 100
+    RESPONSE_CACHE=redis REDIS_URL=redis://localhost:6379/0 python benchmarks/response_cache.py
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from common import auth_headers, seed_user
+
+import httpx
+
+from app import cache
+from app.main import app
+
+
+async def measure(client: httpx.AsyncClient, url: str, headers: dict, requests: int) -> list[float]:
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        r = await client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        r.raise_for_status()
+    return sorted(latencies)
+
+
+async def run(rows: int, requests: int, limit: int) -> None:
+    backend = cache.backend
+    async with app.router.lifespan_context(app):
+        user = await seed_user(rows)
+        headers = auth_headers(user)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for url in (f"/todos/?limit={limit}", f"/todos/?limit={limit}&view=summary", "/categories/", "/tags/"):
+                results = {}
+                for name, cache.backend in (("off", None), (type(backend).__name__, backend)):
+                    latencies = await measure(client, url, headers, requests)
+                    results[name] = (statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1])
+                print(url)
+                for name, (p50, p95) in results.items():
+                    print(f"  {name:>12}: p50 {p50 * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.requests, args.limit))
@@ -0,0 +1,52 @@
+"""Latency of GET /todos/search for a user with many todos.
+
+Seeds one user with --rows todos built from a small vocabulary, so every
+query has plenty of matches, then times --queries searches in-process and
+reports p50/p95. Postgres exercises the tsvector/GIN path, SQLite the LIKE
+fallback:
+
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... python benchmarks/search_latency.py --rows 100000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from common import WORDS, auth_headers, seed_user
+
+import httpx
+
+from app.main import app
+
+
+async def run(rows: int, queries: int, limit: int) -> None:
+    rng = random.Random(1)
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        user = await seed_user(rows)
+        print(f"seeded {rows} todos in {time.perf_counter() - started:.1f} s")
+
+        headers = auth_headers(user)
+        latencies: list[float] = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for _ in range(queries):
+                q = " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+                started = time.perf_counter()
+                r = await client.get("/todos/search", params={"q": q, "limit": limit}, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                r.raise_for_status()
+
+    latencies.sort()
+    print(f"GET /todos/search: {queries} queries, limit {limit}")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.queries, args.limit))
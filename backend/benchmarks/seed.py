@@ -0,0 +1,208 @@
+"""Synthetic data generator: users with todos, categories and tags.
+
+Everything is written with bulk INSERTs (one statement per table and batch)
+and the generated data depends only on --seed. Every user gets the password
+PASSWORD, so seeded accounts work with the login benchmarks:
+
+    python benchmarks/seed.py --users 100 --todos 500 --todo-distribution pareto
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... python benchmarks/seed.py --users 1000 --todos 200
+
+Todo counts per user follow --todo-distribution around the --todos mean:
+fixed (everyone the same), uniform (0..2x mean) or pareto (a few very
+large accounts, most small).
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from common import sentence
+
+from sqlalchemy import insert
+
+from app import auth, crud, models
+from app.database import SessionLocal, engine
+
+PASSWORD = "benchmark"
+COLORS = ["#ef4444", "#f59e0b", "#10b981", "#3b82f6", "#8b5cf6", "#ec4899", "#ffffff"]
+
+
+@dataclass
+class SeedConfig:
+    users: int = 10
+    todos: int = 100
+    todo_distribution: str = "fixed"
+    categories: int = 5
+    tags: int = 20
+    tags_per_todo: float = 1.5
+    completed: float = 0.3
+    categorized: float = 0.7
+    due: float = 0.5
+    seed: int = 0
+    batch: int = 5000
+    prefix: str = field(default_factory=lambda: f"seed{time.time_ns()}")
+
+
+@dataclass
+class SeededUser:
+    id: int
+    email: str
+    todos: int
+    category_ids: list[int]
+    tag_names: list[str]
+
+
+def todo_counts(rng: random.Random, config: SeedConfig) -> list[int]:
+    if config.todo_distribution == "fixed":
+        return [config.todos] * config.users
+    if config.todo_distribution == "uniform":
+        return [rng.randint(0, 2 * config.todos) for _ in range(config.users)]
+    if config.todo_distribution == "pareto":
+        # среднее paretovariate(1.5) равно 3; хвост обрезается на 50 средних
+        return [min(int(rng.paretovariate(1.5) * config.todos / 3), 50 * config.todos) for _ in range(config.users)]
+    raise ValueError(f"Unknown todo distribution: {config.todo_distribution}")
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+async def _insert_returning(db, model, rows: list[dict], *columns):
+    # Core-вставка: ORM bulk insert с RETURNING склеивает результаты пачек за квадратичное время
+    table = model.__table__
+    stmt = insert(table).returning(*(table.c[column.key] for column in columns), sort_by_parameter_order=True)
+    result = await db.execute(stmt, rows)
+    return result.all()
+
+
+async def seed(config: SeedConfig) -> list[SeededUser]:
+    """Создает config.users пользователей с задачами, категориями и тегами"""
+    rng = random.Random(config.seed)
+    hashed_password = await auth.get_password_hash(PASSWORD)
+    counts = todo_counts(rng, config)
+    today = date.today()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        emails = [f"{config.prefix}_{i}@example.com" for i in range(config.users)]
+        user_ids = [
+            user_id for user_id, in await _insert_returning(
+                db, models.User, [{"email": email, "hashed_password": hashed_password} for email in emails],
+                models.User.id,
+            )
+        ]
+        users = [SeededUser(user_id, email, count, [], []) for user_id, email, count in zip(user_ids, emails, counts)]
+
+        categories = [
+            {"name": f"Category {i}", "color": rng.choice(COLORS), "user_id": user.id}
+            for user in users for i in range(config.categories)
+        ]
+        tags = [{"name": f"tag{i}", "user_id": user.id} for user in users for i in range(config.tags)]
+        by_id = {user.id: user for user in users}
+        if categories:
+            for category_id, user_id in await _insert_returning(
+                db, models.Category, categories, models.Category.id, models.Category.user_id
+            ):
+                by_id[user_id].category_ids.append(category_id)
+        tag_ids: dict[int, list[int]] = {user.id: [] for user in users}
+        if tags:
+            for tag_id, user_id, name in await _insert_returning(
+                db, models.Tag, tags, models.Tag.id, models.Tag.user_id, models.Tag.name
+            ):
+                tag_ids[user_id].append(tag_id)
+                by_id[user_id].tag_names.append(name)
+        await db.commit()
+
+        def todo_rows():
+            for user in users:
+                for _ in range(user.todos):
+                    due = rng.random() < config.due
+                    completed = rng.random() < config.completed
+                    yield user, {
+                        "title": sentence(rng, rng.randint(2, 6)),
+                        "description": sentence(rng, rng.randint(0, 20)) or None,
+                        "priority": rng.choice(list(models.Priority)),
+                        "completed": completed,
+                        "completed_on": today - timedelta(days=rng.randint(0, 60)) if completed else None,
+                        "due_date": today + timedelta(days=rng.randint(-30, 60)) if due else None,
+                        "category_id": (
+                            rng.choice(user.category_ids)
+                            if user.category_ids and rng.random() < config.categorized else None
+                        ),
+                        "user_id": user.id,
+                    }
+
+        pending = []
+        for item in todo_rows():
+            pending.append(item)
+            if len(pending) == config.batch:
+                await _insert_todos(db, rng, config, pending, tag_ids)
+                pending = []
+        if pending:
+            await _insert_todos(db, rng, config, pending, tag_ids)
+
+        # счетчики /stats при массовой вставке пересчитываются один раз в конце
+        for start in range(0, len(users), 500):
+            await crud.rebuild_stats(db, [user.id for user in users[start:start + 500]])
+            await db.commit()
+    return users
+
+
+async def _insert_todos(db, rng: random.Random, config: SeedConfig, pending: list, tag_ids: dict[int, list[int]]):
+    rows = await _insert_returning(db, models.Todo, [row for _, row in pending], models.Todo.id)
+    links = []
+    for (user, _), (todo_id,) in zip(pending, rows):
+        available = tag_ids[user.id]
+        for tag_id in rng.sample(available, min(poisson(rng, config.tags_per_todo), len(available))):
+            links.append({"todo_id": todo_id, "tag_id": tag_id})
+    if links:
+        await db.execute(models.todo_tags.insert(), links)
+    await db.commit()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = SeedConfig()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--todos", type=int, default=defaults.todos, help="mean todos per user")
+    parser.add_argument("--todo-distribution", choices=["fixed", "uniform", "pareto"], default=defaults.todo_distribution)
+    parser.add_argument("--categories", type=int, default=defaults.categories, help="categories per user")
+    parser.add_argument("--tags", type=int, default=defaults.tags, help="tags per user")
+    parser.add_argument("--tags-per-todo", type=float, default=defaults.tags_per_todo, help="mean tags per todo")
+    parser.add_argument("--completed", type=float, default=defaults.completed, help="share of completed todos")
+    parser.add_argument("--categorized", type=float, default=defaults.categorized, help="share of todos with a category")
+    parser.add_argument("--due", type=float, default=defaults.due, help="share of todos with a due date")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--batch", type=int, default=defaults.batch)
+
+
+def config_from_args(args: argparse.Namespace) -> SeedConfig:
+    return SeedConfig(
+        users=args.users, todos=args.todos, todo_distribution=args.todo_distribution,
+        categories=args.categories, tags=args.tags, tags_per_todo=args.tags_per_todo,
+        completed=args.completed, categorized=args.categorized, due=args.due,
+        seed=args.seed, batch=args.batch,
+    )
+
+
+async def main(config: SeedConfig) -> None:
+    started = time.perf_counter()
+    users = await seed(config)
+    total = sum(user.todos for user in users)
+    print(f"seeded {len(users)} users, {total} todos in {time.perf_counter() - started:.1f} s")
+    print(f"emails {users[0].email} .. {users[-1].email}, password {PASSWORD!r}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    asyncio.run(main(config_from_args(parser.parse_args())))
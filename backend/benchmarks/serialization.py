@@ -0,0 +1,109 @@
+"""GET /todos serialization: Pydantic validation of ORM objects vs row dicts + orjson.
+
+Seeds one user with --rows todos (each with a category and two tags), then for
+every page size times both paths separately for loading and serializing:
+
+    ORM   - selectinload'ed Todo objects validated through List[schemas.Todo]
+            and rendered by JSONResponse, which is what FastAPI does for a response_model
+    rows  - crud.get_todos() dicts rendered by FastJSONResponse (orjson)
+
+Both bodies are compared before timing, so the fast path must stay byte-for-byte
+equivalent to the schema:
+
+    python benchmarks/serialization.py --rows 5000 --sizes 100 1000 5000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+from common import seed_user
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+from app.main import app
+from app.responses import FastJSONResponse
+
+todo_list = TypeAdapter(List[schemas.Todo])
+
+
+async def attach_categories_and_tags(user: models.User) -> None:
+    async with SessionLocal() as db:
+        categories = (await db.execute(
+            insert(models.Category).returning(models.Category.id),
+            [{"name": f"category {i}", "color": "#ffffff", "user_id": user.id} for i in range(10)],
+        )).scalars().all()
+        tags = (await db.execute(
+            insert(models.Tag).returning(models.Tag.id),
+            [{"name": f"tag {i}", "user_id": user.id} for i in range(20)],
+        )).scalars().all()
+        todo_ids = (await db.execute(select(models.Todo.id).filter(models.Todo.user_id == user.id))).scalars().all()
+        for todo_id in todo_ids:
+            await db.execute(
+                models.Todo.__table__.update()
+                .where(models.Todo.id == todo_id)
+                .values(category_id=categories[todo_id % len(categories)])
+            )
+        await db.execute(models.todo_tags.insert(), [
+            {"todo_id": todo_id, "tag_id": tags[(todo_id + k) % len(tags)]} for todo_id in todo_ids for k in (0, 7)
+        ])
+        await db.commit()
+
+
+async def orm_path(user_id: int, size: int) -> tuple[bytes, float, float]:
+    async with SessionLocal() as db:
+        started = time.perf_counter()
+        query = crud._paginate_todos(crud._todo_query(user_id), 0, size, "created_at", "asc", None)
+        todos = (await db.execute(query)).scalars().all()
+        loaded = time.perf_counter()
+        content = todo_list.dump_python(todo_list.validate_python(todos, from_attributes=True), mode="json")
+        body = JSONResponse(content).body
+        return body, loaded - started, time.perf_counter() - loaded
+
+
+async def rows_path(user_id: int, size: int) -> tuple[bytes, float, float]:
+    async with SessionLocal() as db:
+        started = time.perf_counter()
+        todos = await crud.get_todos(db, user_id, limit=size)
+        loaded = time.perf_counter()
+        body = FastJSONResponse(todos).body
+        return body, loaded - started, time.perf_counter() - loaded
+
+
+def normalized(body: bytes):
+    todos = json.loads(body)
+    for todo in todos:
+        todo["tags"].sort(key=lambda tag: tag["id"])
+    return todos
+
+
+async def run(rows: int, sizes: list[int], repeat: int) -> None:
+    async with app.router.lifespan_context(app):
+        user = await seed_user(rows)
+        await attach_categories_and_tags(user)
+        print(f"seeded {rows} todos")
+
+        for size in sizes:
+            orm_body, _, _ = await orm_path(user.id, size)
+            rows_body, _, _ = await rows_path(user.id, size)
+            assert normalized(orm_body) == normalized(rows_body), "fast path differs from schemas.Todo"
+
+            for name, path in (("ORM", orm_path), ("rows", rows_path)):
+                load, dump = zip(*[(await path(user.id, size))[1:] for _ in range(repeat)])
+                print(f"page {size:>5} {name:>4}: load {statistics.median(load) * 1000:7.1f} ms, "
+                      f"serialize {statistics.median(dump) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.sizes, args.repeat))
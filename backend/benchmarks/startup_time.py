@@ -0,0 +1,57 @@
+"""Cold start of a worker: interpreter, import of app.main and lifespan, in fresh processes.
+
+Each run starts a new interpreter, so nothing is cached between runs except
+the OS page cache and .pyc files. Compare schema modes against a migrated database:
+
+    python benchmarks/startup_time.py --runs 10
+    DB_SCHEMA_STARTUP=skip python benchmarks/startup_time.py
+    ASYNC_DATABASE_URL=postgresql+asyncpg://... DB_SCHEMA_STARTUP=check python benchmarks/startup_time.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+from app import main
+imported = time.perf_counter()
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(run())
+print(json.dumps({"import": imported - started, "lifespan": ready - imported}))
+"""
+
+
+def run_once() -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND, env=os.environ, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - started
+    return result
+
+
+def main(runs: int) -> None:
+    results = [run_once() for _ in range(runs)]
+    print(f"DB_SCHEMA_STARTUP={os.getenv('DB_SCHEMA_STARTUP', 'auto')}, {runs} runs")
+    for phase in ("import", "lifespan", "process"):
+        values = sorted(result[phase] for result in results)
+        print(f"  {phase:>8}: median {statistics.median(values) * 1000:.0f} ms, max {values[-1] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    main(parser.parse_args().runs)
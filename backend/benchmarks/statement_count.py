@@ -0,0 +1,77 @@
+"""Counts SQL statements issued per request for the todo write paths.
+
+Runs the app in-process. Uses ASYNC_DATABASE_URL if set, otherwise a throwaway
+SQLite file:
+
+    python benchmarks/statement_count.py --tags 10 --todos 200
+
+GET /auth/me must stay O(1): its count is printed for --todos todos and
+the script fails if it differs from the count for an empty account.
+"""
+import argparse
+import asyncio
+
+from common import auth_headers, seed_user
+
+import httpx
+from sqlalchemy import event
+
+from app.database import engine
+from app.main import app
+
+statements: list[str] = []
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+async def measure(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> tuple[int, dict]:
+    statements.clear()
+    r = await client.request(method, url, **kwargs)
+    r.raise_for_status()
+    return len(statements), r.json()
+
+
+async def run(tags: int, todos: int) -> None:
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            headers = auth_headers(await seed_user(0))
+            # пользователь попадает в кеш auth, как после /auth/login: дальше считаются только запросы маршрутов
+            await client.get("/auth/me", headers=headers)
+
+            new_tags = [f"tag{i}" for i in range(tags)]
+            count, todo = await measure(client, "POST", "/todos/", headers=headers,
+                                        json={"title": "bench", "tags": new_tags})
+            print(f"POST /todos with {tags} new tags: {count} statements")
+
+            count, _ = await measure(client, "POST", "/todos/", headers=headers,
+                                     json={"title": "bench", "tags": new_tags})
+            print(f"POST /todos with {tags} existing tags: {count} statements")
+
+            replaced = [f"other{i}" for i in range(tags)]
+            count, _ = await measure(client, "PUT", f"/todos/{todo['id']}", headers=headers,
+                                     json={"completed": True, "tags": replaced})
+            print(f"PUT /todos/{{id}} replacing {tags} tags: {count} statements")
+
+            me_counts = {}
+            for include in ("", "?include=stats"):
+                empty, _ = await measure(client, "GET", f"/auth/me{include}", headers=headers)
+                me_counts[include] = empty
+            operations = [{"op": "create", "data": {"title": f"bench {i}", "tags": new_tags[:2]}} for i in range(todos)]
+            for start in range(0, todos, 500):
+                await measure(client, "POST", "/todos/batch", headers=headers, json={"operations": operations[start:start + 500]})
+            for include, empty in me_counts.items():
+                count, _ = await measure(client, "GET", f"/auth/me{include}", headers=headers)
+                print(f"GET /auth/me{include} with {todos + 2} todos: {count} statements")
+                if count != empty:
+                    raise SystemExit(f"GET /auth/me{include} grew from {empty} to {count} statements")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tags", type=int, default=10)
+    parser.add_argument("--todos", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.tags, args.todos))
@@ -0,0 +1,26 @@
+# Настройки, которые gunicorn подхватывает из текущего каталога автоматически.
+# Метрики Prometheus собираются со всех воркеров, если задан PROMETHEUS_MULTIPROC_DIR.
+import glob
+import os
+
+
+def on_starting(server):
+    # файлы метрик прошлого запуска исказили бы счетчики
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+    # схема сверяется с миграциями один раз до запуска воркеров: при расхождении
+    # gunicorn не стартует, а воркеры получают DB_SCHEMA_STARTUP=skip (см. app/startup.py)
+    from app.startup import check_schema_once
+
+    check_schema_once()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
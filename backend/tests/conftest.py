@@ -0,0 +1,61 @@
+"""Фикстуры тестов: приложение в процессе на временной SQLite и подсчет SQL-запросов.
+
+    async def test_list(client, headers, max_queries):
+        with max_queries(3):
+            await client.get("/todos/", headers=headers)
+
+ASYNC_DATABASE_URL из окружения имеет приоритет, например для прогона на Postgres.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from uuid import uuid4
+
+os.environ.setdefault("AUTH_SECRET_KEY", "test")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+
+import httpx
+import pytest
+
+from app import auth
+from app.main import app as application
+from app.profiling import profile_sql
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    async with application.router.lifespan_context(application):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://test") as client:
+            yield client
+    auth.user_cache.clear()
+
+
+@pytest.fixture
+async def headers(client):
+    """Новый пользователь на каждый тест: задачи других тестов не влияют на счетчики"""
+    email = f"user_{uuid4().hex}@example.com"
+    r = await client.post("/auth/register", json={"email": email, "password": "password"})
+    assert r.status_code == 200, r.text
+    r = await client.post("/auth/login", data={"username": email, "password": "password"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def max_queries():
+    """with max_queries(n): ... - падает, если блок выполнил больше n SQL-запросов"""
+
+    @contextmanager
+    def check(limit: int):
+        with profile_sql() as profile:
+            yield profile
+        assert profile.count <= limit, f"{profile.count} SQL queries, expected at most {limit}:\n" + "\n".join(
+            f"{count} x {shape}" for shape, (count, _) in profile.shapes().items()
+        )
+
+    return check
@@ -0,0 +1,32 @@
+"""POST /import: пока клиент передает файл, соединение из пула не занято"""
+import asyncio
+
+import pytest
+
+from app import auth
+from app.database import engine
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("dry_run", [True, False])
+async def test_no_connection_held_while_uploading(client, headers, dry_run):
+    # без кеша пользователь для проверки токена читается из базы той же сессией
+    auth.user_cache.clear()
+    checked_out = []
+
+    async def body():
+        yield b"title,tags\n"
+        for i in range(5):
+            await asyncio.sleep(0.01)
+            checked_out.append(engine.pool.checkedout())
+            yield f"todo {i},imported\n".encode()
+
+    r = await client.post(
+        "/import/", params={"dry_run": dry_run}, content=body(), headers={**headers, "Content-Type": "text/csv"},
+    )
+    assert r.status_code == 200, r.text
+    assert r.json()["imported"] == 5
+    assert checked_out == [0] * 5
+    todos = (await client.get("/todos/", headers=headers)).json()
+    assert len(todos) == (0 if dry_run else 5)
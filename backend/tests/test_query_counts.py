@@ -0,0 +1,68 @@
+"""Число SQL-запросов на маршрут: списки не должны расти с числом задач (N+1)"""
+import pytest
+
+from app.profiling import profile_sql
+
+pytestmark = pytest.mark.anyio
+
+READ_LIMITS = {
+    "/todos/": 3,
+    "/categories/": 2,
+    "/tags/": 2,
+    "/auth/me": 1,
+    "/stats/": 2,
+    "/sync/": 6,
+}
+
+
+async def seed(client, headers, count: int):
+    category = (await client.post("/categories/", headers=headers, json={"name": "work"})).json()
+    for i in range(count):
+        r = await client.post(
+            "/todos/", headers=headers,
+            json={"title": f"todo {i}", "category_id": category["id"], "tags": [f"tag{i}", "common"]},
+        )
+        assert r.status_code == 200, r.text
+
+
+@pytest.mark.parametrize("path, limit", READ_LIMITS.items())
+async def test_read_queries(client, headers, max_queries, path, limit):
+    await seed(client, headers, 20)
+    with max_queries(limit):
+        r = await client.get(path, headers=headers)
+    assert r.status_code == 200
+
+
+@pytest.mark.parametrize("path", READ_LIMITS)
+async def test_read_queries_do_not_grow(client, headers, path):
+    counts = []
+    for count in (1, 20):
+        await seed(client, headers, count)
+        with profile_sql() as profile:
+            await client.get(path, headers=headers)
+        counts.append(profile.count)
+    assert counts[0] == counts[1], f"{path}: {counts[0]} queries for 1 todo, {counts[1]} for 21"
+
+
+async def test_write_queries(client, headers, max_queries):
+    tags = [f"tag{i}" for i in range(10)]
+    with max_queries(6):
+        todo = (await client.post("/todos/", headers=headers, json={"title": "new tags", "tags": tags})).json()
+    with max_queries(5):
+        await client.post("/todos/", headers=headers, json={"title": "existing tags", "tags": tags})
+    with max_queries(10):
+        r = await client.put(
+            f"/todos/{todo['id']}", headers=headers, json={"completed": True, "tags": [f"other{i}" for i in range(10)]},
+        )
+    assert r.status_code == 200
+
+
+async def test_existing_tag_keeps_versions(client, headers, max_queries):
+    await client.post("/tags/", headers=headers, json={"name": "home"})
+    etag = (await client.get("/tags/", headers=headers)).headers["etag"]
+    sync_cursor = (await client.get("/sync/", headers=headers)).json()["cursor"]
+    with max_queries(1):
+        r = await client.post("/tags/", headers=headers, json={"name": "home"})
+    assert r.status_code == 200
+    assert (await client.get("/tags/", headers=headers)).headers["etag"] == etag
+    assert (await client.get("/sync/", headers=headers)).json()["cursor"] == sync_cursor
@@ -0,0 +1,73 @@
+"""Проверка схемы в мастере gunicorn: воркеры после fork ее не повторяют"""
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import startup
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+MASTER = textwrap.dedent("""
+    import asyncio, os, sys
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app import startup  # как gunicorn.conf.py: модуль импортирован до проверки
+
+    async def stamp():
+        engine = create_async_engine(os.environ["ASYNC_DATABASE_URL"])
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+            for head in startup.migration_heads():
+                await conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": head})
+        await engine.dispose()
+
+    asyncio.run(stamp())
+    print("master", startup.schema_mode(), flush=True)
+    startup.check_schema_once()
+    pid = os.fork()
+    if pid == 0:
+        from app.main import app
+        print("worker", startup.schema_mode(), flush=True)
+        os._exit(0)
+    os.waitpid(pid, 0)
+""")
+
+
+def test_forked_worker_skips_schema_check(tmp_path):
+    env = {
+        **os.environ,
+        "AUTH_SECRET_KEY": "test",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path}/master.db",
+        "DB_SCHEMA_STARTUP": "check",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", MASTER], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["master", "check", "worker", "skip"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("setting", ["auto", "check"])
+async def test_unstamped_database(tmp_path, monkeypatch, setting):
+    """База без alembic_version (docker compose с init.sql): auto создает таблицы, check не стартует"""
+    monkeypatch.setenv("DB_SCHEMA_STARTUP", setting)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/unstamped.db")
+    try:
+        if setting == "check":
+            with pytest.raises(startup.SchemaMismatchError):
+                await startup.prepare_schema(engine, "check")
+        else:
+            await startup.prepare_schema(engine, "check")
+        async with engine.connect() as conn:
+            tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+        assert ("todos" in tables) == (setting == "auto")
+    finally:
+        await engine.dispose()
@@ -0,0 +1,73 @@
+"""Лента /sync: limit соблюдается и внутри одного номера изменения"""
+import pytest
+from sqlalchemy import update
+
+from app import models
+from app.database import SessionLocal
+
+pytestmark = pytest.mark.anyio
+
+
+async def walk(client, headers, since, limit):
+    rows, pages = [], 0
+    while True:
+        params = {"limit": limit} if since is None else {"limit": limit, "since": since}
+        r = await client.get("/sync/", headers=headers, params=params)
+        assert r.status_code == 200, r.text
+        page = r.json()
+        page_rows = [("todos", todo["id"]) for todo in page["todos"]]
+        page_rows += [("categories", category["id"]) for category in page["categories"]]
+        page_rows += [("tags", tag["id"]) for tag in page["tags"]]
+        page_rows += [("deleted", object_id) for ids in page["deleted"].values() for object_id in ids]
+        assert len(page_rows) <= limit
+        rows += page_rows
+        pages += 1
+        since = page["cursor"]
+        if not page["has_more"]:
+            return rows, since, pages
+
+
+async def test_pages_within_one_seq(client, headers):
+    category = (await client.post("/categories/", headers=headers, json={"name": "work"})).json()
+    for i in range(10):
+        await client.post("/todos/", headers=headers, json={"title": f"todo {i}", "category_id": category["id"], "tags": [f"t{i}"]})
+    me = (await client.get("/auth/me", headers=headers)).json()
+    # как после миграции, добавившей sync_seq: у всех строк номер 0
+    async with SessionLocal() as db:
+        for table in (models.Todo, models.Category, models.Tag):
+            await db.execute(update(table).filter(table.user_id == me["id"]).values(sync_seq=0))
+        await db.commit()
+
+    snapshot, cursor, _ = await walk(client, headers, None, 1000)
+    rows, last_cursor, pages = await walk(client, headers, None, 3)
+    assert sorted(rows) == sorted(snapshot)
+    assert len(rows) == 21 and pages == 7
+    assert last_cursor == cursor
+
+
+async def test_delta_split_inside_batch(client, headers):
+    _, cursor, _ = await walk(client, headers, None, 1000)
+    operations = [{"op": "create", "data": {"title": f"batch {i}"}} for i in range(5)]
+    await client.post("/todos/batch", headers=headers, json={"operations": operations})
+    rows, _, pages = await walk(client, headers, cursor, 2)
+    assert len(rows) == 5 and pages == 3
+
+
+async def test_invalid_cursor(client, headers):
+    for since in ("x", "1-unknown-2", "-1"):
+        r = await client.get("/sync/", headers=headers, params={"since": since})
+        assert r.status_code == 400
+
+
+async def test_category_rename_reaches_todos(client, headers):
+    category = (await client.post("/categories/", headers=headers, json={"name": "work", "color": "#000000"})).json()
+    todo = (await client.post("/todos/", headers=headers, json={"title": "report", "category_id": category["id"]})).json()
+    _, cursor, _ = await walk(client, headers, None, 1000)
+
+    r = await client.put(f"/categories/{category['id']}", headers=headers, json={"name": "office", "color": "#ff0000"})
+    assert r.status_code == 200, r.text
+    page = (await client.get("/sync/", headers=headers, params={"since": cursor})).json()
+    todos = {row["id"]: row for row in page["todos"]}
+    assert todos[todo["id"]]["category"]["name"] == "office"
+    assert todos[todo["id"]]["category"]["color"] == "#ff0000"
+    assert [row["name"] for row in page["categories"]] == ["office"]